@@ -4,9 +4,21 @@ import tempfile
 import os
 import matplotlib.pyplot as plt
 from datetime import datetime
-from src.analytics import load_data2 as load_data_table
-from src.plotting import price_history_figure, multi_stock_history_figure, volatility_figure, portfolio_value_figure, profit_loss_figure
-from src.data_loader import is_valid_ticker
+from src.analytics import load_data2 as load_data_table, group_by_ticker, ticker_index, paginate
+from src.plotting import price_history_figure, multi_stock_history_figure, volatility_figure, portfolio_value_figure, value_history_figure, profit_loss_figure, risk_distribution_figure, efficient_frontier_figure, scenario_profit_figure
+from src.data_loader import is_valid_ticker, history_cache_usage, ticker_stats
+from src.stats import portfolio_stats
+from src.fetcher import FetchError
+from src.fx import BASE_CURRENCY, CURRENCIES, currency_columns, currency_label, format_money
+from src.risk import portfolio_risk
+from src.optimizer import optimize_portfolio
+from src.scenarios import what_if
+from src.benchmark import BENCHMARKS, benchmark_comparison, position_alpha_beta
+from src.returns import portfolio_returns
+from src.export import FORMATS, export_type, report_tables, build_export
+from src.snapshot import save_snapshot, load_snapshot, refresh_in_background
+from src.storage import portfolio_key, record_snapshots, value_history, latest_summary
+from src.household import build_firm
 #https://portfolio-program.streamlit.app/
 
 
@@ -42,6 +54,39 @@ if "table" not in st.session_state:
 if "portfolio" not in st.session_state:
     st.session_state.portfolio = None
 
+# Warm start: show the last saved portfolio immediately and reprice it in the background
+if st.session_state.portfolio is None and "warm_start" not in st.session_state:
+    snap_portfolio, snap_saved_at = load_snapshot()
+    st.session_state.warm_start = snap_saved_at
+    if snap_portfolio is not None:
+        st.session_state.portfolio = snap_portfolio
+        st.session_state.table = snap_portfolio.get_summary_df()
+        st.session_state.refresh_future = refresh_in_background(snap_portfolio)
+
+current_base = st.session_state.portfolio.base_currency if st.session_state.portfolio else BASE_CURRENCY
+st.sidebar.selectbox("Base Currency", CURRENCIES, key="base_currency",
+                     index=CURRENCIES.index(current_base) if current_base in CURRENCIES else 0,
+                     help="Costs convert at the FX rate on each purchase date, values at today's rate.")
+
+@st.fragment(run_every=2)
+def poll_background_refresh():
+    """Swaps in the repriced portfolio once the background refresh finishes."""
+    future = st.session_state.get("refresh_future")
+    if future is None:
+        return
+    if not future.done():
+        st.caption(f"Showing snapshot from {st.session_state.warm_start:%Y-%m-%d %H:%M}; refreshing live prices…")
+        return
+    st.session_state.refresh_future = None
+    # A partly failed refresh keeps showing the snapshot rather than its fallback values
+    if future.exception() is None and not future.result().get_stale_tickers():
+        st.session_state.portfolio = future.result()
+        st.session_state.table = st.session_state.portfolio.get_summary_df()
+        st.session_state.snapshot_key = None
+    st.rerun()
+
+poll_background_refresh()
+
 if use_editor:
     st.subheader("Inventory Management")
     # Initialize empty dataframe for the data editor
@@ -69,15 +114,23 @@ if use_editor:
         if editor_df.empty or editor_df.dropna().empty:
             st.warning("Please enter at least one valid stock position.")
         else:
-            invalid_tickers = [t for t in editor_df["ticker"].dropna() if not is_valid_ticker(t)]
-            if invalid_tickers:
+            try:
+                invalid_tickers = [t for t in editor_df["ticker"].dropna() if not is_valid_ticker(t)]
+            except FetchError as e:
+                invalid_tickers = None
+                st.error(f"Market data is unreachable, tickers could not be validated: {e}")
+            if invalid_tickers is None:
+                pass
+            elif invalid_tickers:
                 st.error(f"Invalid Tickers Detected: {', '.join(invalid_tickers)}. Please check symbols.")
             else:
                 try:
                     with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
                         tmp.write(editor_df.to_csv(index=False).encode("utf-8"))
                         path = tmp.name
-                    st.session_state.table, st.session_state.portfolio = load_data_table(path)
+                    st.session_state.table, st.session_state.portfolio = load_data_table(path, st.session_state.base_currency)
+                    st.session_state.refresh_future = None
+                    save_snapshot(st.session_state.portfolio)
                     st.rerun()
                 except Exception as e:
                     st.error(f"Computation Error: {str(e)}")
@@ -91,17 +144,19 @@ else:
     st.subheader("Batch File Upload")
     uploaded = st.file_uploader("Select CSV Portfolio File", type=["csv"], key="csv_loader_main")
 
-    if uploaded is not None:
+    # Reprice only when a new file is uploaded, not on every rerun while one is present
+    if uploaded is not None and st.session_state.get("upload_id") != uploaded.file_id:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
             tmp.write(uploaded.getvalue())
             path = tmp.name
-        
-        # Load and check for changes to prevent recursive loop
-        new_table, new_portfolio = load_data_table(path)
-        if st.session_state.table is None or not new_table.equals(st.session_state.table):
-            st.session_state.table = new_table
-            st.session_state.portfolio = new_portfolio
-            st.rerun()
+
+        new_table, new_portfolio = load_data_table(path, st.session_state.base_currency)
+        st.session_state.upload_id = uploaded.file_id
+        st.session_state.table = new_table
+        st.session_state.portfolio = new_portfolio
+        st.session_state.refresh_future = None
+        save_snapshot(new_portfolio)
+        st.rerun()
 
 # --- ANALYTICS DISPLAY SECTION ---
 table = st.session_state.table
@@ -110,39 +165,130 @@ if table is None or table.empty:
     st.info("Awaiting data input... Populate the table or upload a CSV to begin analysis.")
     st.stop()
 
+stale_tickers = st.session_state.portfolio.get_stale_tickers()
+if stale_tickers and st.session_state.get("refresh_future") is None:
+    st.warning(f"Live prices unavailable for {', '.join(stale_tickers)}; showing the last known price.")
+
+# Reporting currency: positions are converted in place, at purchase-date and current FX rates
+if st.session_state.portfolio.base_currency != st.session_state.base_currency:
+    st.session_state.portfolio.set_base_currency(st.session_state.base_currency)
+    st.session_state.table = table = st.session_state.portfolio.get_summary_df()
+    save_snapshot(st.session_state.portfolio)
+
+unconverted = st.session_state.portfolio.get_unconverted_tickers()
+if unconverted:
+    st.warning(f"No exchange rate into {st.session_state.portfolio.base_currency} for {', '.join(unconverted)}; "
+               "these lots are shown in their quote currency and left out of all totals.")
+uncosted = st.session_state.portfolio.get_uncosted_tickers()
+if uncosted:
+    st.warning(f"Purchase price history unavailable for {', '.join(uncosted)}; these lots are left out of all totals.")
+
+cache_usage = history_cache_usage()
+st.sidebar.caption(f"Price history cache: {cache_usage['tickers']} tickers, "
+                   f"{cache_usage['bytes'] / 2**20:.1f} / {cache_usage['budget_bytes'] / 2**20:.0f} MB")
+
+# Per-ticker consolidation and row index are rebuilt only when the table changes
+if st.session_state.get("grouped_key") is not table:
+    grouped = group_by_ticker(table)
+    # 52-week range at today's FX rate, to sit next to the base-currency amounts
+    stats = ticker_stats(grouped["Stock Ticker"], {p.ticker: p.fx_now if p.converted else float("nan")
+                                                  for p in st.session_state.portfolio.positions})
+    st.session_state.grouped = grouped.merge(stats, on="Stock Ticker", how="left") if not stats.empty else grouped
+    st.session_state.ticker_rows = ticker_index(table)
+    st.session_state.grouped_key = table
+grouped = st.session_state.grouped
+ticker_rows = st.session_state.ticker_rows
+
 st.subheader("Performance Inventory")
+view_mode = st.radio("View", ["By Ticker", "By Lot"], horizontal=True, label_visibility="collapsed")
 # Display the processed data excluding the raw date for a cleaner look
-st.dataframe(table.drop(columns=["Purchase Date"]), use_container_width=True)
+view = grouped if view_mode == "By Ticker" else table.drop(columns=["Purchase Date"])
+base = st.session_state.portfolio.base_currency
+view = currency_columns(view, base)
 
-# Portfolio Aggregates calculation
-prof, cost, ret = st.session_state.portfolio.get_totals()
+# Sort and slice server-side so only the visible page is sent to the browser
+c_sort, c_dir, c_size, c_page = st.columns(4)
+sort_by = c_sort.selectbox("Sort By", list(view.columns), index=list(view.columns).index(currency_label("Profit ($)", base)))
+ascending = c_dir.selectbox("Order", ["Descending", "Ascending"]) == "Ascending"
+page_size = c_size.selectbox("Rows Per Page", [25, 50, 100, 250], index=1)
+n_pages = max(1, -(-len(view) // page_size))
+page = c_page.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1)
+st.dataframe(paginate(view, int(page), page_size, sort_by, ascending), use_container_width=True, hide_index=True)
+
+# While a warm start is repricing in the background, only cached and stored data is shown;
+# anything that would download price history waits for the refreshed portfolio
+refreshing = st.session_state.get("refresh_future") is not None
 
-portfolio_age = (datetime.now() - pd.to_datetime(table["Purchase Date"]).min()).days
+# Persist daily valuation snapshots once per loaded portfolio; later views read from SQLite
+pf_key = portfolio_key(st.session_state.portfolio)
+if not refreshing and st.session_state.get("snapshot_key") != pf_key:
+    record_snapshots(st.session_state.portfolio)
+    st.session_state.snapshot_key = pf_key
+
+# Portfolio Aggregates calculation
+summary = latest_summary(pf_key)
+if summary is not None:
+    prof, cost, ret, portfolio_age = summary
+else:
+    prof, cost, ret = st.session_state.portfolio.get_totals()
+    portfolio_age = (datetime.now() - pd.to_datetime(table["Purchase Date"]).min()).days
 
 st.subheader("Executive Summary")
 m1, m2, m3, m4 = st.columns(4)
-m1.metric("Unrealized P/L", f"${prof:,.2f}", delta=f"{ret:.2f}%")
-m2.metric("Total Invested Capital", f"${cost:,.2f}")
+m1.metric("Unrealized P/L", format_money(prof, base), delta=f"{ret:.2f}%")
+m2.metric("Total Invested Capital", format_money(cost, base))
 m3.metric("Portfolio Growth", f"{ret:.2f}%")
 m4.metric("Portfolio Age", f"{portfolio_age} days")
 
-st.download_button(
-    label="Export Portfolio Report (CSV)",
-    data=table.to_csv(index=False).encode("utf-8"),
-    file_name=f"portfolio_analysis_{datetime.now().strftime('%Y%m%d')}.csv",
-    mime="text/csv",
-)
+pf_stats = portfolio_stats(value_history(pf_key))
+if pf_stats:
+    d1, d2, d3, d4 = st.columns(4)
+    d1.metric("Max Drawdown", f"{pf_stats['Max Drawdown (%)']:.2f}%")
+    d2.metric("Current Drawdown", f"{pf_stats['Current Drawdown (%)']:.2f}%")
+    d3.metric("YTD Return", f"{pf_stats['YTD Return (%)']:.2f}%")
+    d4.metric("1Y Return", f"{pf_stats['1Y Return (%)']:.2f}%")
+
+returns = portfolio_returns(st.session_state.portfolio) if not refreshing else {}
+if returns:
+    r1, r2, r3 = st.columns(3)
+    r1.metric("Time-Weighted Return", f"{returns['twr']:.2f}%")
+    r2.metric("TWR (Annualised)", f"{returns['twr_annualised']:.2f}%")
+    r3.metric("Money-Weighted Return (XIRR)", f"{returns['xirr']:.2f}% / yr")
+    with st.expander("Returns by Ticker"):
+        st.dataframe(returns["tickers"], use_container_width=True, hide_index=True)
+        st.markdown("**Time-weighted return** measures how the investments themselves performed, ignoring when money was added. **Money-weighted return (XIRR)** is the annual rate your actual deposits earned, so it rewards buying before rises and penalises buying before falls.")
+
+# Reports are only built when the download button is clicked
+with st.expander("Export Portfolio Report"):
+    e1, e2, e3 = st.columns(3)
+    export_fmt = e1.selectbox("Format", list(FORMATS))
+    include_value = e2.checkbox("Include portfolio value series", value=False)
+    include_history = e3.checkbox("Include price history per ticker", value=False)
+    export_ext, export_mime = export_type(export_fmt, 1 + include_value + include_history)
+    st.download_button(
+        label=f"Download Report (.{export_ext})",
+        data=lambda t=table, k=pf_key, v=include_value, h=include_history, f=export_fmt:
+            build_export(report_tables(currency_columns(t, base), value_history(k) if v else None, h), f),
+        file_name=f"portfolio_analysis_{datetime.now().strftime('%Y%m%d')}.{export_ext}",
+        mime=export_mime,
+        on_click="ignore",
+    )
+
+if refreshing:
+    st.info("Charts, risk and scenario analysis will appear once live prices have loaded.")
+    st.stop()
 
 # --- VISUALIZATION SECTION ---
 st.subheader("Market Visualization")
-ticker_choice = st.selectbox("Analyze Individual Asset", sorted(table["Stock Ticker"].unique()))
+ticker_choice = st.selectbox("Analyze Individual Asset", list(ticker_rows))
 
-# Locate selection data for charting
-sel_row = table[table["Stock Ticker"] == ticker_choice].iloc[0]
+# Locate selection data for charting via the ticker -> rows index
+sel_row = table.iloc[ticker_rows[ticker_choice][0]]
 sel_date = sel_row["Purchase Date"]
 
-tab_single, tab_vol, tab_pv, tab_pl, tab_multi, tab_alloc = st.tabs([
-    "Asset History", "Volatility", "Portfolio Value", "P&L", "Comparison View", "Capital Allocation"
+tab_single, tab_vol, tab_pv, tab_pl, tab_multi, tab_alloc, tab_risk, tab_whatif, tab_house = st.tabs([
+    "Asset History", "Volatility", "Portfolio Value", "P&L", "Comparison View", "Capital Allocation", "Risk", "What-If",
+    "Households"
 ])
 
 with tab_single:
@@ -156,19 +302,92 @@ with tab_vol:
         st.markdown("**20-Day Rolling Volatility**\n\nShows how much the stock's daily price moves have varied over the last 20 trading days. A higher value means bigger swings and more risk. Spikes indicate periods of uncertainty or major news events.")
 
 with tab_pv:
-    st.pyplot(portfolio_value_figure(table))
+    stored_history = value_history(pf_key)
+    bench_choice = st.selectbox("Compare Against", ["None", *BENCHMARKS])
+    comparison = benchmark_comparison(stored_history, bench_choice, st.session_state.portfolio.base_currency) if bench_choice != "None" else {}
+    if stored_history.empty:
+        st.pyplot(portfolio_value_figure(table))
+    else:
+        st.pyplot(value_history_figure(stored_history, comparison.get("benchmark_value"), base))
+    if comparison:
+        b1, b2, b3 = st.columns(3)
+        b1.metric(f"{bench_choice} Return (same cash)", f"{comparison['benchmark_return']:.2f}%")
+        b2.metric("Excess Return", f"{comparison['excess_return']:.2f}%")
+        b3.metric("Tracking Error (ann.)", f"{comparison['tracking_error']:.2f}%")
+        st.dataframe(position_alpha_beta(st.session_state.portfolio, bench_choice), use_container_width=True, hide_index=True)
     with st.popover("ℹ️ Portfolio Value"):
-        st.markdown("**Portfolio Total Value Over Time**\n\n**Green line** — combined market value of all holdings each day.\n\n**Grey dashed line** — total amount you invested (cost basis). It only steps up when a new stock is purchased, and stays flat otherwise.\n\nThe gap between the two lines shows how much of the growth comes from price changes, not new purchases.")
+        st.markdown("**Portfolio Total Value Over Time**\n\n**Green line** — combined market value of all holdings each day.\n\n**Grey dashed line** — total amount you invested (cost basis). It only steps up when a new stock is purchased, and stays flat otherwise.\n\nThe gap between the two lines shows how much of the growth comes from price changes, not new purchases.\n\n**Blue line** (when a benchmark is selected) — what the same deposits, made on the same days, would be worth in that index fund. **Tracking error** is how much your daily returns deviate from the benchmark's, annualised.")
 
 with tab_pl:
-    st.pyplot(profit_loss_figure(table))
+    st.pyplot(profit_loss_figure(grouped, base))
     with st.popover("ℹ️ P&L"):
-        st.markdown("**Unrealised Profit / Loss**\n\nShows how much each stock has gained (green) or lost (red) since purchase, in dollars. Values are unrealised — they only become real when you sell.")
+        st.markdown("**Unrealised Profit / Loss**\n\nShows how much each stock has gained (green) or lost (red) since purchase, in your reporting currency. Values are unrealised — they only become real when you sell.")
 
 with tab_multi:
-    st.pyplot(multi_stock_history_figure(table))
+    st.pyplot(multi_stock_history_figure(grouped))
 
 with tab_alloc:
     fig_pie, ax_pie = plt.subplots()
-    ax_pie.pie(table["Total Cost ($)"], labels=table["Stock Ticker"], autopct="%1.1f%%", startangle=140)
-    st.pyplot(fig_pie)
\ No newline at end of file
+    # Tickers without a base-currency cost have no share of the allocation
+    allocated = grouped[grouped["Total Cost ($)"] > 0]
+    ax_pie.pie(allocated["Total Cost ($)"], labels=allocated["Stock Ticker"], autopct="%1.1f%%", startangle=140)
+    st.pyplot(fig_pie)
+
+    frontier = optimize_portfolio(st.session_state.portfolio)
+    if frontier:
+        st.pyplot(efficient_frontier_figure(frontier))
+        target = st.radio("Rebalance Towards", ["Max Sharpe", "Min Variance"], horizontal=True)
+        trades = frontier["max_sharpe_trades"] if target == "Max Sharpe" else frontier["min_variance_trades"]
+        st.dataframe(currency_columns(trades, base), use_container_width=True, hide_index=True)
+        with st.popover("ℹ️ Efficient Frontier"):
+            st.markdown("**Efficient Frontier**\n\nEach point on the blue curve is the highest expected return achievable for its level of risk using only your current holdings (no short selling), estimated from the last year of daily prices.\n\n**Min Variance** is the least volatile mix; **Max Sharpe** earns the most return per unit of risk. The table lists the trades that would move your current holdings to whole-share quantities in the selected mix; split-adjusted holdings can make a trade fractional.")
+
+with tab_risk:
+    r1, r2 = st.columns(2)
+    confidence = r1.select_slider("Confidence Level", options=[0.90, 0.95, 0.99], value=0.95)
+    horizon = r2.number_input("Horizon (trading days)", min_value=1, max_value=60, value=1)
+    risk = portfolio_risk(st.session_state.portfolio, confidence=confidence, horizon=int(horizon))
+    if not risk:
+        st.info("Not enough overlapping price history to estimate portfolio risk.")
+    else:
+        k1, k2, k3, k4 = st.columns(4)
+        k1.metric("Parametric VaR", format_money(risk['parametric'][0], base),
+                  help=f"CVaR {format_money(risk['parametric'][1], base)}")
+        k2.metric("Historical VaR", format_money(risk['historical'][0], base),
+                  help=f"CVaR {format_money(risk['historical'][1], base)}")
+        k3.metric("Monte Carlo VaR", format_money(risk['monte_carlo'][0], base),
+                  help=f"CVaR {format_money(risk['monte_carlo'][1], base)}")
+        k4.metric("Portfolio Beta (SPY)", f"{risk['portfolio_beta']:.2f}")
+        st.pyplot(risk_distribution_figure(risk["mc_pnl"], risk["monte_carlo"][0], base))
+        st.dataframe(risk["assets"], use_container_width=True, hide_index=True)
+    with st.popover("ℹ️ Value at Risk"):
+        st.markdown("**Value at Risk (VaR)**\n\nThe loss the portfolio should not exceed over the chosen horizon at the chosen confidence level. **CVaR** (hover a metric) is the average loss on the days that do exceed it.\n\n**Parametric** assumes normally distributed returns, **Historical** replays the last year of real daily moves, and **Monte Carlo** simulates 100,000 correlated scenarios.\n\n**Beta** measures how strongly a stock moves with the S&P 500 (SPY).")
+
+with tab_whatif:
+    w1, w2 = st.columns(2)
+    shift_days = w1.slider("Shift Purchase Dates (days)", min_value=-365, max_value=90, value=(-90, 30), step=5)
+    multipliers = w2.multiselect("Quantity Multipliers", [0.5, 1.0, 1.5, 2.0, 3.0], default=[0.5, 1.0, 2.0])
+    lots, summary = what_if(st.session_state.portfolio, range(shift_days[0], shift_days[1] + 1, 5), multipliers or [1.0])
+    if summary.empty:
+        st.info("No price history available for the selected scenarios.")
+    else:
+        st.pyplot(scenario_profit_figure(summary, base))
+        st.dataframe(currency_columns(summary, base), use_container_width=True, hide_index=True)
+    with st.popover("ℹ️ What-If"):
+        st.markdown("**What-If Scenarios**\n\nRe-prices every holding as if it had been bought earlier or later (negative shift = earlier) and in larger or smaller amounts, using the same price history as the rest of the dashboard. Each line shows the total profit for one quantity multiplier across all purchase-date shifts.")
+
+with tab_house:
+    # Accounts share the already-priced positions, so the hierarchy is rebuilt only when the table changes
+    if st.session_state.get("firm_key") is not table:
+        st.session_state.firm = build_firm(st.session_state.portfolio)
+        st.session_state.firm_key = table
+    firm = st.session_state.firm
+    st.dataframe(currency_columns(firm.summary(), base), use_container_width=True, hide_index=True)
+    paths = {" / ".join(path): path for path in [()] + [(h,) for h in firm.children] + list(firm.accounts())}
+    scope = st.selectbox("Value History For", list(paths), format_func=lambda p: p or firm.name)
+    node_history = firm.history_at(paths[scope])
+    node_history = node_history[node_history["cost_basis"] > 0]
+    if not node_history.empty:
+        st.pyplot(value_history_figure(node_history, currency=base))
+    with st.popover("ℹ️ Households"):
+        st.markdown("**Households**\n\nAdd optional `account` and `household` columns to the CSV to group lots into accounts, accounts into households and households into the firm. Totals and value histories roll up from the accounts; lots without labels are grouped under *Unassigned*.")
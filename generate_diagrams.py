@@ -1,15 +1,25 @@
 """
 Generate all Criterion B design diagrams for the IB CS IA.
 Outputs PNG images into a /diagrams folder.
-Run: python generate_diagrams.py
+Run: python generate_diagrams.py                 (render changed diagrams in parallel)
+     python generate_diagrams.py uml_class       (rebuild named diagrams only)
+     python generate_diagrams.py --force         (rebuild everything)
 """
 import graphviz
+import matplotlib
+matplotlib.use("Agg")  # headless backend, safe in worker processes
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 from matplotlib.patches import FancyBboxPatch
+import argparse
+import hashlib
+import inspect
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 OUT = "diagrams"
+MANIFEST = os.path.join(OUT, ".hashes.json")
 os.makedirs(OUT, exist_ok=True)
 
 # ============================================================
@@ -225,6 +235,7 @@ def module_dependency():
     g.node("analytics", "analytics.py\n(Controller)", fillcolor="#D5E8D4", color="#82B366")
     g.node("models", "models.py\n(Model / OOP)", fillcolor="#FFF2CC", color="#D6B656")
     g.node("data_loader", "data_loader.py\n(Data Access / API)", fillcolor="#F8CECC", color="#B85450")
+    g.node("fetcher", "fetcher.py\n(Market Data Client)", fillcolor="#F8CECC", color="#B85450")
     g.node("plotting", "plotting.py\n(Visualization)", fillcolor="#E1D5E7", color="#9673A6")
 
     g.node("streamlit", "Streamlit\n(Framework)", shape="box", fillcolor="#EEEEEE", color="#999999")
@@ -236,8 +247,9 @@ def module_dependency():
     g.edge("app", "plotting", label="price_history_figure()\nmulti_stock_history_figure()")
     g.edge("app", "data_loader", label="is_valid_ticker()")
     g.edge("analytics", "models", label="build_portfolio_from_csv()")
-    g.edge("models", "data_loader", label="fetch_stock_value()")
-    g.edge("data_loader", "yfinance", style="dashed")
+    g.edge("models", "fetcher", label="fetch_quote()")
+    g.edge("data_loader", "fetcher", label="fetch_history()")
+    g.edge("fetcher", "yfinance", style="dashed")
     g.edge("app", "streamlit", style="dashed")
     g.edge("plotting", "matplotlib", style="dashed")
     g.edge("plotting", "yfinance", style="dashed")
@@ -568,19 +580,95 @@ def pseudocode_diagram():
     print("✓ Pseudocode Flowchart")
 
 
+# ============================================================
+# BUILD — registry, change detection, parallel rendering
+# ============================================================
+# Diagram name -> (render function, PNG files it writes into OUT)
+DIAGRAMS = {
+    "flowchart": (flowchart, ["1_system_flowchart.png"]),
+    "dfd_context": (dfd_context, ["2_dfd_context.png"]),
+    "dfd_level1": (dfd_level1, ["3_dfd_level1.png"]),
+    "uml_class": (uml_class, ["4_uml_class_diagram.png"]),
+    "module_dependency": (module_dependency, ["5_module_dependency.png"]),
+    "ui_mockups": (ui_mockups, ["6a_mockup_login.png", "6b_mockup_dashboard.png"]),
+    "data_dictionary": (data_dictionary, ["7_data_dictionary.png"]),
+    "test_plan": (test_plan, ["8_test_plan.png"]),
+    "dev_schedule": (dev_schedule, ["9_development_schedule.png"]),
+    "pseudocode_diagram": (pseudocode_diagram, ["10_pseudocode_flowchart.png"]),
+}
+
+
+def source_hash(name):
+    """Hash of a diagram's definition (its function source), used to detect changes."""
+    return hashlib.sha256(inspect.getsource(DIAGRAMS[name][0]).encode("utf-8")).hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST):
+        return {}
+    with open(MANIFEST) as f:
+        return json.load(f)
+
+
+def is_up_to_date(name, manifest):
+    """True when the recorded hash matches and every PNG the diagram produces still exists."""
+    outputs = DIAGRAMS[name][1]
+    return (manifest.get(name) == source_hash(name)
+            and all(os.path.exists(os.path.join(OUT, png)) for png in outputs))
+
+
+def render(name):
+    """Worker entry point: renders one diagram and returns its name."""
+    DIAGRAMS[name][0]()
+    return name
+
+
+def build(names=None, force=False, jobs=None):
+    """Renders the requested (default: all) diagrams in a process pool, skipping unchanged ones.
+    Returns the names of diagrams that failed to render."""
+    manifest = load_manifest()
+    selected = names or list(DIAGRAMS)
+    # Explicitly named diagrams are always rebuilt
+    todo = [n for n in selected if force or names or not is_up_to_date(n, manifest)]
+    for name in selected:
+        if name not in todo:
+            print(f"- {name} (unchanged, skipped)")
+    failed = []
+    if not todo:
+        return failed
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(render, name): name for name in todo}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"✗ {name}: {e}")
+                failed.append(name)
+                continue
+            manifest[name] = source_hash(name)
+            # Record progress as each diagram finishes so an interrupted run keeps its work
+            with open(MANIFEST, "w") as f:
+                json.dump(manifest, f, indent=2, sort_keys=True)
+    return failed
+
+
 # ============================================================
 # RUN ALL
 # ============================================================
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate IA design diagrams.")
+    parser.add_argument("names", nargs="*", metavar="name", help=f"diagram(s) to rebuild: {', '.join(DIAGRAMS)}")
+    parser.add_argument("--force", action="store_true", help="rebuild even if unchanged")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+    unknown = [n for n in args.names if n not in DIAGRAMS]
+    if unknown:
+        parser.error(f"unknown diagram(s): {', '.join(unknown)}")
+
     print(f"Generating diagrams into ./{OUT}/\n")
-    flowchart()
-    dfd_context()
-    dfd_level1()
-    uml_class()
-    module_dependency()
-    ui_mockups()
-    data_dictionary()
-    test_plan()
-    dev_schedule()
-    pseudocode_diagram()
+    failed = build(args.names, args.force, args.jobs)
+    if failed:
+        raise SystemExit(f"\n❌ Failed to render: {', '.join(failed)}")
     print(f"\n✅ All diagrams saved to ./{OUT}/")
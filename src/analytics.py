@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 from src.models import Portfolio
+from src.fx import BASE_CURRENCY
 
-def build_portfolio_from_csv(positions_path: str) -> Portfolio:
+def build_portfolio_from_csv(positions_path: str, base_currency: str = BASE_CURRENCY) -> Portfolio:
     """Factory function to generate a Portfolio object from a CSV source."""
     df = pd.read_csv(positions_path)
     # Flexible column detection
@@ -12,15 +14,78 @@ def build_portfolio_from_csv(positions_path: str) -> Portfolio:
 
     df[date_col] = pd.to_datetime(df[date_col])
     
-    portfolio = Portfolio()
+    portfolio = Portfolio(base_currency)
     for _, r in df.iterrows():
-        portfolio.add_position(r["ticker"], r[date_col], int(r["quantity"]))
+        # Optional account / household columns place the lot in the household hierarchy
+        account, household = (str(r[c]) if pd.notna(r.get(c)) else None for c in ("account", "household"))
+        portfolio.add_position(r["ticker"], r[date_col], int(r["quantity"]), account, household)
     
     portfolio.refresh_all()
     return portfolio
 
 # Legacy compatibility wrapper
-def load_data2(positions: str) -> tuple:
+def load_data2(positions: str, base_currency: str = BASE_CURRENCY) -> tuple:
     """Returns (DataFrame, Portfolio) so callers can use Portfolio methods directly."""
-    pf = build_portfolio_from_csv(positions)
+    pf = build_portfolio_from_csv(positions, base_currency)
     return pf.get_summary_df(), pf
+
+def group_by_ticker(table: pd.DataFrame) -> pd.DataFrame:
+    """Consolidates lots into one row per ticker with a single groupby pass."""
+    if table.empty:
+        return table
+    grouped = table.groupby("Stock Ticker", sort=True).agg(**{
+        "Purchase Date": ("Purchase Date", "min"),
+        "Lots": ("Quantity", "size"),
+        "Quantity": ("Quantity", "sum"),
+        "Shares Held": ("Shares Held", "sum"),
+        "Total Cost ($)": ("Total Cost ($)", "sum"),
+        "Current Value ($)": ("Current Value ($)", "sum"),
+        "Profit ($)": ("Profit ($)", "sum"),
+        "Dividends ($)": ("Dividends ($)", "sum"),
+        "Converted": ("Current Value ($)", "count"),
+    }).reset_index()
+    # Tickers with no known cost in the base currency keep blank amounts instead of summing to zero
+    money = ["Total Cost ($)", "Current Value ($)", "Profit ($)", "Dividends ($)"]
+    grouped[money] = grouped[money].where(grouped.pop("Converted") > 0)
+    # Quantity-weighted average cost across all lots of the ticker
+    grouped.insert(6, "Cost Per Share ($)", (grouped["Total Cost ($)"] / grouped["Quantity"].where(grouped["Quantity"] > 0)).round(2))
+    grouped["Percentage Return (%)"] = (grouped["Profit ($)"] / grouped["Total Cost ($)"].where(grouped["Total Cost ($)"] != 0) * 100).fillna(0.0).round(2)
+    grouped["Total Return (%)"] = ((grouped["Profit ($)"] + grouped["Dividends ($)"]) / grouped["Total Cost ($)"].where(grouped["Total Cost ($)"] != 0) * 100).fillna(0.0).round(2)
+    grouped[money] = grouped[money].round(2)
+    return grouped
+
+def ticker_index(table: pd.DataFrame) -> dict:
+    """Maps each ticker to the positional row numbers of its lots, for O(1) selection."""
+    return table.groupby("Stock Ticker", sort=True).indices
+
+def paginate(table: pd.DataFrame, page: int, page_size: int, sort_by: str = None, ascending: bool = True) -> pd.DataFrame:
+    """Returns only the rows of the requested (1-based) page after server-side sorting."""
+    if sort_by is not None and sort_by in table.columns:
+        order = table[sort_by].to_numpy().argsort(kind="stable")
+        if not ascending:
+            order = order[::-1]
+    else:
+        order = None
+    start = (page - 1) * page_size
+    rows = order[start:start + page_size] if order is not None else slice(start, start + page_size)
+    return table.iloc[rows]
+
+def holdings_matrix(positions, prices: pd.DataFrame) -> tuple:
+    """
+    Shares held and cumulative amount invested per ticker on every date of `prices`.
+    Purchases are scattered onto their first trading day and accumulated with one cumulative sum.
+    Lots bought before the first date count from row 0; lots after the last date are ignored.
+    The amount invested is on the same dividend-adjusted basis as Yahoo's closes, so a lot is worth
+    its cost on the day it is bought and dividends show up as growth afterwards.
+    """
+    dates = prices.index.values
+    cols = prices.columns.get_indexer([p.ticker for p in positions])
+    rows = np.searchsorted(dates, pd.to_datetime([p.purchase_date for p in positions]).normalize().values)
+    # Lots without a known cost in the base currency are left off the price grid
+    ok = (cols >= 0) & np.array([p.valued for p in positions], dtype=bool)
+    held = np.zeros((len(dates) + 1, len(prices.columns)))
+    invested = np.zeros((len(dates) + 1, len(prices.columns)))
+    # Split-adjusted share counts, to match the split-adjusted price history
+    np.add.at(held, (rows[ok], cols[ok]), np.array([p.shares for p in positions], dtype=float)[ok])
+    np.add.at(invested, (rows[ok], cols[ok]), np.array([p.buy_value * p.price_factor for p in positions], dtype=float)[ok])
+    return np.cumsum(held[:-1], axis=0), np.cumsum(invested[:-1], axis=0)
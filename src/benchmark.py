@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from src.fetcher import FetchError
+from src.history_cache import HISTORY_STORE, EPOCH
+from src.data_loader import build_price_matrix
+from src.fx import fx_rates, ticker_currency
+from src.risk import TRADING_DAYS
+from src.stats import daily_returns_ex_flows
+
+BENCHMARKS = ("SPY", "QQQ")
+
+
+def benchmark_prices(ticker: str, dates: pd.DatetimeIndex, base_currency: str = None) -> np.ndarray:
+    """
+    Benchmark closes aligned to a date grid: the last close on or before each date.
+    The shared history is fetched once per process and topped up incrementally;
+    alignment is a single searchsorted over its day-number index, not a join.
+    """
+    try:
+        hist = HISTORY_STORE.update(ticker)
+    except FetchError:
+        hist = HISTORY_STORE.peek(ticker)
+    if hist is None or not len(hist.days):
+        return np.full(len(dates), np.nan)
+    grid = (dates.values.astype("datetime64[D]") - EPOCH).astype(np.int32)
+    pos = np.searchsorted(hist.days, grid, side="right") - 1
+    close = hist.columns["Close"].astype(np.float64)
+    aligned = np.where(pos >= 0, close[np.clip(pos, 0, None)], np.nan)
+    if base_currency is not None:
+        aligned = aligned * fx_rates(np.full(len(dates), ticker_currency(ticker), dtype=object), dates, base_currency)
+    return aligned
+
+
+def benchmark_comparison(history: pd.DataFrame, ticker: str = "SPY", base_currency: str = None) -> dict:
+    """
+    Compares a stored value history (date-indexed market_value / cost_basis) with a benchmark.
+    The benchmark curve invests the same cash on the same days, so both lines share a cost basis.
+    """
+    if history.empty:
+        return {}
+    bench = benchmark_prices(ticker, history.index, base_currency)
+    flows = np.diff(history["cost_basis"].to_numpy(dtype=float), prepend=0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        units = np.nancumsum(np.where(flows != 0, flows / bench, 0.0))
+    bench_value = units * bench
+
+    port_rets = daily_returns_ex_flows(history)
+    bench_rets = np.diff(bench, prepend=np.nan) / np.roll(bench, 1)
+    active = port_rets - bench_rets
+    ok = ~np.isnan(active)
+    cost = history["cost_basis"].iloc[-1]
+    port_return = (history["market_value"].iloc[-1] / cost - 1) * 100 if cost else 0.0
+    bench_return = (bench_value[-1] / cost - 1) * 100 if cost else 0.0
+
+    return {
+        "benchmark": ticker,
+        "benchmark_value": pd.Series(bench_value, index=history.index, name=ticker),
+        "portfolio_return": float(port_return),
+        "benchmark_return": float(bench_return),
+        "excess_return": float(port_return - bench_return),
+        "tracking_error": float(np.std(active[ok], ddof=1) * np.sqrt(TRADING_DAYS) * 100) if ok.sum() > 1 else 0.0,
+    }
+
+
+def position_alpha_beta(portfolio, ticker: str = "SPY") -> pd.DataFrame:
+    """
+    Annualised alpha and beta of every position against the benchmark over its own holding period.
+    All positions are solved together on one return matrix, with pre-purchase days masked out.
+    """
+    if not portfolio.positions:
+        return pd.DataFrame()
+    first = min(pd.Timestamp(p.purchase_date) for p in portfolio.positions)
+    prices = build_price_matrix([p.ticker for p in portfolio.positions], start=first,
+                                base_currency=portfolio.base_currency)
+    if prices.empty:
+        return pd.DataFrame()
+    bench = benchmark_prices(ticker, prices.index, portfolio.base_currency)
+    rets = prices.pct_change(fill_method=None).to_numpy()
+    b = np.diff(bench, prepend=np.nan) / np.roll(bench, 1)
+
+    cols = prices.columns.get_indexer([p.ticker for p in portfolio.positions])
+    bought = pd.to_datetime([p.purchase_date for p in portfolio.positions]).normalize().values
+    held = prices.index.values[:, None] > bought[None, :]
+    x = np.where(held & (cols >= 0), rets[:, np.clip(cols, 0, None)], np.nan)
+    bb = np.where(~np.isnan(x) & ~np.isnan(b)[:, None], b[:, None], np.nan)
+    x = np.where(np.isnan(bb), np.nan, x)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx, mb = np.nanmean(x, axis=0), np.nanmean(bb, axis=0)
+        beta = np.nansum((x - mx) * (bb - mb), axis=0) / np.nansum((bb - mb) ** 2, axis=0)
+        alpha = (mx - beta * mb) * TRADING_DAYS * 100
+
+    return pd.DataFrame({
+        "Stock Ticker": [p.ticker for p in portfolio.positions],
+        "Purchase Date": [p.purchase_date for p in portfolio.positions],
+        f"Beta vs {ticker}": np.round(beta, 2),
+        "Alpha (% / yr)": np.round(alpha, 2),
+        "Days Observed": np.count_nonzero(~np.isnan(x), axis=0),
+    })
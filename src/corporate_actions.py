@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+# Separates tickers when all event days are searched as one sorted key array
+TICKER_STRIDE = np.int64(2**32)
+
+
+class CorporateActions:
+    """
+    Split and dividend events for one ticker with their cumulative adjustment factors.
+    Only event rows are kept. Suffix arrays are built once, so the factors for any set of
+    purchase dates come from a single searchsorted: entry k covers events k onwards and the
+    final entry is the identity for lots bought after the last event.
+    """
+    def __init__(self, days: np.ndarray, splits: np.ndarray, dividends: np.ndarray, close_before: np.ndarray):
+        # `days` are the last trading days before each ex-date: a lot bought on or before that day
+        # owned the shares when the event happened. Dividends are per current (split-adjusted) share.
+        self.days = days
+        self.splits = splits
+        self.dividends = dividends
+        n = len(days)
+        self.split_after = np.ones(n + 1)
+        self.split_after[:n] = np.cumprod(splits[::-1])[::-1]
+        self.dividends_after = np.zeros(n + 1)
+        self.dividends_after[:n] = np.cumsum(dividends[::-1])[::-1]
+        self.price_factor_after = self._price_factors(dividends, close_before)
+
+    @staticmethod
+    def _price_factors(dividends: np.ndarray, close_before: np.ndarray) -> np.ndarray:
+        """
+        Yahoo's adjusted close scales every bar before an ex-date by 1 - dividend / close, using
+        the unadjusted close of the previous day. Only the adjusted close is cached, so the factors
+        are recovered newest event first: f = 1 / (1 + dividend * later_factors / adjusted_close).
+        """
+        factors = np.ones(len(dividends) + 1)
+        for k in range(len(dividends) - 1, -1, -1):
+            f = 1.0
+            if dividends[k] > 0 and close_before[k] > 0:
+                f = 1.0 / (1.0 + dividends[k] * factors[k + 1] / close_before[k])
+            factors[k] = f * factors[k + 1]
+        return factors
+
+    @classmethod
+    def from_arrays(cls, days: np.ndarray, close: np.ndarray, splits: np.ndarray = None, dividends: np.ndarray = None):
+        """Extracts the event rows from full-length daily columns (zeros mean no event)."""
+        splits = np.zeros(len(days)) if splits is None else np.nan_to_num(splits.astype(np.float64))
+        dividends = np.zeros(len(days)) if dividends is None else np.nan_to_num(dividends.astype(np.float64))
+        rows = np.flatnonzero((splits > 0) | (dividends > 0))
+        prev = np.maximum(rows - 1, 0)
+        return cls(
+            np.where(rows > 0, days[prev], days[rows] - 1).astype(np.int32),
+            np.where(splits[rows] > 0, splits[rows], 1.0),
+            dividends[rows],
+            close[prev].astype(np.float64),
+        )
+
+    def factors(self, days: np.ndarray) -> tuple:
+        """(split factor, price factor, dividends per share) for lots bought on the given day numbers."""
+        pos = np.searchsorted(self.days, days, side="left")
+        return self.split_after[pos], self.price_factor_after[pos], self.dividends_after[pos]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.days, self.splits, self.dividends, self.split_after,
+                                      self.dividends_after, self.price_factor_after))
+
+    def __len__(self):
+        return len(self.days)
+
+
+def lot_adjustments(actions: list, ticker_idx: np.ndarray, days: np.ndarray) -> tuple:
+    """
+    (split factor, price factor, dividends per share) for many lots across many tickers.
+    Lot i belongs to `actions[ticker_idx[i]]` and was bought on day number `days[i]`.
+    Every ticker's events and a trailing identity slot are laid out in one key array, so all
+    lots are resolved with one searchsorted regardless of how many tickers they span.
+    """
+    keys = np.concatenate([t * TICKER_STRIDE + np.append(a.days.astype(np.int64), TICKER_STRIDE - 1)
+                           for t, a in enumerate(actions)])
+    pos = np.searchsorted(keys, ticker_idx.astype(np.int64) * TICKER_STRIDE + days, side="left")
+    split = np.concatenate([a.split_after for a in actions])[pos]
+    price = np.concatenate([a.price_factor_after for a in actions])[pos]
+    dividends = np.concatenate([a.dividends_after for a in actions])[pos]
+    return split, price, dividends
+
+
+def apply_corporate_actions(positions, histories: dict):
+    """
+    Restates every lot for the splits and dividends since it was bought: current share count,
+    the price actually paid (Yahoo's adjusted close undone) and dividends received.
+    Lots whose ticker has no cached history keep their previous adjustment.
+    """
+    positions = [p for p in positions if histories.get(p.ticker) is not None]
+    if not positions:
+        return
+    tickers = list(dict.fromkeys(p.ticker for p in positions))
+    order = {t: i for i, t in enumerate(tickers)}
+    ticker_idx = np.array([order[p.ticker] for p in positions])
+    days = pd.to_datetime([p.purchase_date for p in positions]).values.astype("datetime64[D]").astype(np.int64)
+    split, price, dividends = lot_adjustments([histories[t].actions for t in tickers], ticker_idx, days)
+    for pos, s, f, d in zip(positions, split, price, dividends):
+        pos.apply_actions(float(s), float(f), float(d))
@@ -1,36 +1,63 @@
+import time
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-from datetime import datetime
+from src.fetcher import REFRESH_BUDGET, FetchError, fetch_history, run_with_budget
+from src.history_cache import HISTORY_STORE
+from src.fx import convert_price_matrix
 
 @st.cache_data
 def is_valid_ticker(ticker: str) -> bool:
-    """Validator to check if ticker actually exists on Yahoo Finance."""
-    stock = yf.Ticker(ticker)
-    try:
-        # If history comes back empty, the ticker is likely invalid
-        hist = stock.history(period="1d")
-        return not hist.empty
-    except:
-        return False
+    """Validator to check if ticker actually exists on Yahoo Finance.
+    Raises FetchError when Yahoo cannot be reached, so outages are not reported as bad symbols."""
+    # If history comes back empty, the ticker is likely invalid
+    hist = fetch_history(ticker, period="1d")
+    return not hist.empty
 
-@st.cache_data
-def fetch_stock_value(ticker: str, bdate: datetime, quant: int) -> tuple:
-    """Retrieve position valuations using historical and current data."""
-    stock = yf.Ticker(ticker)
+def fetch_close_history(ticker: str) -> pd.Series:
+    """Full daily closing price history for one ticker, timezone-naive."""
+    try:
+        return HISTORY_STORE.get(ticker).to_series()
+    except FetchError:
+        # Yahoo unreachable and nothing cached: callers treat this like an unknown symbol
+        return pd.Series(dtype=float, name=ticker.upper())
 
-    # Latest market closing price
-    hist_current = stock.history(period='1d')
-    if hist_current.empty: return 0.0, 0.0
-    current_price = hist_current['Close'].iloc[-1]
+def history_cache_usage() -> dict:
+    """Memory usage and hit/miss counters of the shared price-history cache."""
+    return HISTORY_STORE.memory_usage()
 
-    # Max history with timezone normalization for slicing
-    hist = stock.history(period='max')
-    hist.index = hist.index.tz_localize(None)
+def ticker_stats(tickers, fx_now: dict = None) -> pd.DataFrame:
+    """Materialised drawdown, range and period-return stats for cached tickers (no downloads).
+    With `fx_now` (ticker -> today's rate), the 52-week range is converted from the quote currency."""
+    stats = HISTORY_STORE.stats_table(tickers)
+    if fx_now is not None and not stats.empty:
+        rates = stats["Stock Ticker"].map(fx_now).astype(float)
+        stats[["52W High", "52W Low"]] = stats[["52W High", "52W Low"]].mul(rates, axis=0)
+    return stats
 
-    # First available closing price at or after purchase date
-    start_prices = hist.loc[bdate:, "Close"]
-    if start_prices.empty: return current_price * quant, 0.0 # Handle dates out of range
-    buy_price = start_prices.iloc[0]
+def refresh_histories(tickers, budget: float = REFRESH_BUDGET) -> set:
+    """Appends newly published bars to the cached histories within `budget` seconds.
+    Returns the tickers that could not be brought up to date."""
+    deadline = time.monotonic() + budget
+    _, unfinished = run_with_budget({t: (lambda t=t: HISTORY_STORE.update(t, deadline=deadline))
+                                     for t in dict.fromkeys(t.upper() for t in tickers)}, budget)
+    return unfinished
 
-    return current_price * quant, buy_price * quant
+def build_price_matrix(tickers, start=None, base_currency: str = None, deadline: float = None) -> pd.DataFrame:
+    """Aligned closing prices (dates x tickers) from the cached per-ticker histories,
+    converted into `base_currency` at each day's FX rate when one is given.
+    Uncached histories are downloaded concurrently until `deadline` (REFRESH_BUDGET from now by default);
+    tickers that fail or run out of time are left out instead of raising."""
+    unique = list(dict.fromkeys(t.upper() for t in tickers))
+    deadline = deadline if deadline is not None else time.monotonic() + REFRESH_BUDGET
+    missing = [t for t in unique if HISTORY_STORE.peek(t) is None]
+    run_with_budget({t: (lambda t=t: HISTORY_STORE.get(t, deadline)) for t in missing},
+                    max(deadline - time.monotonic(), 0))
+    histories = [HISTORY_STORE.peek(t) for t in unique]
+    series = [h.to_series() for h in histories if h is not None and len(h.days)]
+    if not series: return pd.DataFrame()
+    prices = pd.concat(series, axis=1).sort_index().ffill()
+    if start is not None:
+        prices = prices.loc[pd.Timestamp(start):]
+    if base_currency is not None:
+        prices = convert_price_matrix(prices, base_currency, deadline)
+    return prices
@@ -0,0 +1,87 @@
+import io
+import zipfile
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.data_loader import fetch_close_history
+
+CHUNK_ROWS = 50_000
+
+# Format name -> (file extension, MIME type)
+FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+def history_long_format(tickers) -> pd.DataFrame:
+    """Cached closing prices for each ticker stacked into (ticker, date, close) rows."""
+    frames = []
+    for ticker in dict.fromkeys(tickers):
+        close = fetch_close_history(ticker)
+        if close.empty:
+            continue
+        frames.append(pd.DataFrame({"Stock Ticker": ticker, "Date": close.index, "Close": close.to_numpy()}))
+    if not frames:
+        return pd.DataFrame(columns=["Stock Ticker", "Date", "Close"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def report_tables(table: pd.DataFrame, value_series: pd.DataFrame = None, include_history: bool = False) -> dict:
+    """Collects the tables that make up a report; nothing is serialised yet."""
+    tables = {"positions": table}
+    if value_series is not None:
+        tables["portfolio_value"] = value_series.reset_index()
+    if include_history:
+        tables["price_history"] = history_long_format(table["Stock Ticker"])
+    return tables
+
+
+def iter_arrow_chunks(df: pd.DataFrame, schema: pa.Schema, chunk_rows: int = CHUNK_ROWS):
+    """Yields Arrow tables of at most `chunk_rows` rows converted with a shared schema."""
+    for start in range(0, len(df), chunk_rows):
+        yield pa.Table.from_pandas(df.iloc[start:start + chunk_rows], schema=schema, preserve_index=False)
+
+
+def write_table(df: pd.DataFrame, fmt: str, sink):
+    """Streams one DataFrame into a binary file-like object, chunk by chunk."""
+    if fmt == "CSV":
+        # pandas keeps the plain dates and unquoted headers of the original CSV export
+        for start in range(0, max(len(df), 1), CHUNK_ROWS):
+            sink.write(df.iloc[start:start + CHUNK_ROWS].to_csv(index=False, header=start == 0).encode("utf-8"))
+        return
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    if fmt == "Parquet":
+        writer = pq.ParquetWriter(sink, schema)
+    elif fmt == "Arrow":
+        writer = pa.ipc.new_file(sink, schema)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    with writer:
+        for chunk in iter_arrow_chunks(df, schema):
+            writer.write_table(chunk)
+
+
+def export_type(fmt: str, n_tables: int) -> tuple:
+    """(file extension, MIME type) of an export: the format itself, or a zip for several tables."""
+    return FORMATS[fmt] if n_tables == 1 else ("zip", "application/zip")
+
+
+def build_export(tables: dict, fmt: str) -> io.BytesIO:
+    """
+    Writes the report into one in-memory buffer, rewound for reading.
+    A single table is written as-is; several tables are bundled into a zip archive.
+    Tables are streamed into the buffer chunk by chunk and the buffer is returned without a copy.
+    """
+    ext = FORMATS[fmt][0]
+    out = io.BytesIO()
+    if len(tables) == 1:
+        write_table(next(iter(tables.values())), fmt, out)
+    else:
+        with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for name, df in tables.items():
+                with archive.open(f"{name}.{ext}", "w", force_zip64=True) as member:
+                    write_table(df, fmt, member)
+    out.seek(0)
+    return out
@@ -0,0 +1,163 @@
+import os
+import time
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFPricesMissingError, YFTickerMissingError, YFTzMissingError
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, stop_after_delay, wait_exponential
+
+REQUEST_TIMEOUT = float(os.environ.get("PM_REQUEST_TIMEOUT", 10))   # seconds per HTTP request
+REFRESH_BUDGET = float(os.environ.get("PM_REFRESH_BUDGET", 30))     # seconds for a whole refresh
+MAX_ATTEMPTS = 3
+MAX_WORKERS = 8
+YAHOO_HOST = "finance.yahoo.com"
+
+# Latest market price per ticker; stale=True marks a value served from cache after a failure
+Quote = namedtuple("Quote", ["price", "as_of", "stale"])
+
+
+class FetchError(Exception):
+    """Market data could not be retrieved (timeout, network or upstream error)."""
+
+
+class CircuitOpenError(FetchError):
+    """Requests to a host are suspended after repeated failures."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a host after `threshold` consecutive failures.
+    After `cooldown` seconds one trial request is let through; success closes the circuit.
+    """
+    def __init__(self, threshold: int = 5, cooldown: float = 60.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Half-open: let this request probe the host
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_last_quotes = {}
+_quotes_lock = threading.Lock()
+
+
+def breaker_for(host: str) -> CircuitBreaker:
+    """Returns the shared circuit breaker for a host, creating it on first use."""
+    with _breakers_lock:
+        return _breakers.setdefault(host, CircuitBreaker())
+
+
+def guarded_call(fn, *args, host: str = YAHOO_HOST, deadline: float = None, **kwargs):
+    """
+    Runs a market-data call with exponential-backoff retries behind the host's circuit breaker.
+    Retries stop at MAX_ATTEMPTS or when the optional monotonic `deadline` is reached.
+    """
+    breaker = breaker_for(host)
+    stop = stop_after_attempt(MAX_ATTEMPTS)
+    if deadline is not None:
+        stop = stop | stop_after_delay(max(deadline - time.monotonic(), 0))
+
+    def attempt():
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit open for {host}")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            breaker.record_failure()
+            raise FetchError(str(e)) from e
+        breaker.record_success()
+        return result
+
+    retrying = Retrying(
+        stop=stop,
+        wait=wait_exponential(multiplier=0.25, max=4),
+        retry=retry_if_exception(lambda e: isinstance(e, FetchError) and not isinstance(e, CircuitOpenError)),
+        reraise=True,
+    )
+    return retrying(attempt)
+
+
+def _history(ticker: str, **kwargs) -> pd.DataFrame:
+    try:
+        return yf.Ticker(ticker).history(raise_errors=True, **kwargs)
+    except (YFPricesMissingError, YFTickerMissingError, YFTzMissingError):
+        # Unknown or delisted symbol: a valid answer, not a transport failure
+        return pd.DataFrame()
+
+
+def fetch_history(ticker: str, deadline: float = None, **kwargs) -> pd.DataFrame:
+    """yfinance history() with a request timeout, retries and circuit breaking."""
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    return guarded_call(_history, ticker, deadline=deadline, **kwargs)
+
+
+def fetch_quote(ticker: str, deadline: float = None) -> Quote:
+    """Latest closing price, falling back to the last good quote (flagged stale) on failure."""
+    try:
+        hist = fetch_history(ticker, deadline, period="1d")
+    except FetchError:
+        return last_quote(ticker)
+    if hist.empty:
+        return Quote(None, None, False)
+    quote = Quote(float(hist["Close"].iloc[-1]), datetime.now(), False)
+    with _quotes_lock:
+        _last_quotes[ticker] = quote
+    return quote
+
+
+def last_quote(ticker: str) -> Quote:
+    """The most recent successful quote for a ticker, marked stale (price None if never priced)."""
+    with _quotes_lock:
+        quote = _last_quotes.get(ticker)
+    if quote is None:
+        return Quote(None, None, True)
+    return quote._replace(stale=True)
+
+
+def run_with_budget(tasks: dict, budget: float = REFRESH_BUDGET) -> tuple:
+    """
+    Runs named zero-argument callables concurrently and returns (results, unfinished names)
+    once all finish or `budget` seconds elapse, whichever is first. Failed tasks count as unfinished.
+    """
+    results, unfinished = {}, set()
+    if not tasks:
+        return results, unfinished
+    pool = ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tasks)))
+    futures = {pool.submit(fn): name for name, fn in tasks.items()}
+    done, pending = wait(futures, timeout=budget)
+    # Stragglers are abandoned rather than awaited; their request timeouts let them exit on their own
+    pool.shutdown(wait=False, cancel_futures=True)
+    for future in done:
+        if future.exception() is None:
+            results[futures[future]] = future.result()
+        else:
+            unfinished.add(futures[future])
+    unfinished.update(futures[f] for f in pending)
+    return results, unfinished
+
@@ -0,0 +1,150 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFPricesMissingError, YFTickerMissingError, YFTzMissingError
+from src.fetcher import REQUEST_TIMEOUT, FetchError, guarded_call
+from src.history_cache import HISTORY_STORE, EPOCH
+
+BASE_CURRENCY = os.environ.get("PM_BASE_CURRENCY", "USD")
+CURRENCIES = ("USD", "EUR", "GBP", "JPY", "CHF", "CAD", "AUD", "HKD")
+
+# Exchanges that quote in a sub-unit (pence, cents, agorot): quote code -> (currency, factor)
+SUBUNITS = {"GBp": ("GBP", 0.01), "GBX": ("GBP", 0.01), "ZAc": ("ZAR", 0.01), "ILA": ("ILS", 0.01)}
+# Used only when Yahoo's metadata cannot be reached
+SUFFIX_CURRENCY = {
+    ".L": "GBp", ".T": "JPY", ".HK": "HKD", ".DE": "EUR", ".F": "EUR", ".PA": "EUR", ".AS": "EUR",
+    ".MI": "EUR", ".MC": "EUR", ".SW": "CHF", ".TO": "CAD", ".V": "CAD", ".AX": "AUD", ".KS": "KRW",
+    ".SS": "CNY", ".SZ": "CNY", ".NS": "INR", ".SA": "BRL",
+}
+
+_currency_cache = {}
+_currency_lock = threading.Lock()
+
+
+def _suffix_currency(ticker: str) -> str:
+    for suffix, code in SUFFIX_CURRENCY.items():
+        if ticker.endswith(suffix):
+            return code
+    return "USD"
+
+
+def _quote_currency(ticker: str):
+    """
+    Currency from Yahoo's chart metadata, or None when the symbol is unknown or has none.
+    Only transport errors are raised, so a metadata miss never counts against the circuit breaker.
+    """
+    stock = yf.Ticker(ticker)
+    try:
+        stock.history(period="5d", raise_errors=True, timeout=REQUEST_TIMEOUT)
+    except (YFPricesMissingError, YFTickerMissingError, YFTzMissingError):
+        return None
+    return (stock.get_history_metadata() or {}).get("currency")
+
+
+def ticker_currency(ticker: str, deadline: float = None, fetch: bool = True) -> str:
+    """Quote currency of a symbol from Yahoo metadata, cached per process after the first lookup."""
+    ticker = ticker.upper()
+    with _currency_lock:
+        if ticker in _currency_cache:
+            return _currency_cache[ticker]
+    if not fetch:
+        return _suffix_currency(ticker)
+    try:
+        code = guarded_call(_quote_currency, ticker, deadline=deadline)
+    except FetchError:
+        # Not cached, so the real metadata is picked up once Yahoo is reachable again
+        return _suffix_currency(ticker)
+    # Yahoo answered without a currency: the exchange suffix is the best answer there is
+    code = code or _suffix_currency(ticker)
+    with _currency_lock:
+        _currency_cache[ticker] = code
+    return code
+
+
+def fx_pair(code: str, base: str) -> tuple:
+    """(Yahoo FX symbol or None when no conversion is needed, sub-unit factor) for a quote currency."""
+    currency, factor = SUBUNITS.get(code, (code.upper(), 1.0))
+    if currency == base:
+        return None, factor
+    return f"{currency}{base}=X", factor
+
+
+def fx_rates(codes, dates, base: str = BASE_CURRENCY, fetch: bool = True, deadline: float = None) -> np.ndarray:
+    """
+    Conversion factor into `base` for each (quote currency, date) pair.
+    Each FX series is loaded once from the shared history cache and all dates for that
+    currency are aligned with one searchsorted (last rate on or before the date).
+    Missing series give NaN.
+    """
+    codes = np.asarray(codes, dtype=object)
+    days = (pd.to_datetime(np.asarray(dates)).values.astype("datetime64[D]") - EPOCH).astype(np.int32)
+    if days.ndim == 0 or len(days) == 1:
+        days = np.broadcast_to(days, codes.shape)
+    rates = np.full(codes.shape, np.nan)
+    for code in pd.unique(codes):
+        mask = codes == code
+        symbol, factor = fx_pair(code, base)
+        if symbol is None:
+            rates[mask] = factor
+            continue
+        try:
+            hist = HISTORY_STORE.update(symbol, deadline=deadline) if fetch else HISTORY_STORE.peek(symbol)
+        except FetchError:
+            hist = HISTORY_STORE.peek(symbol)
+        if hist is None or not len(hist.days):
+            continue
+        # Dates before the first FX print use the earliest available rate
+        pos = np.clip(np.searchsorted(hist.days, days[mask], side="right") - 1, 0, None)
+        rates[mask] = hist.columns["Close"][pos].astype(np.float64) * factor
+    return rates
+
+
+def convert_price_matrix(prices: pd.DataFrame, base: str = BASE_CURRENCY, deadline: float = None) -> pd.DataFrame:
+    """Converts a dates x tickers price matrix into `base` with one element-wise multiply."""
+    if prices.empty:
+        return prices
+    codes = np.array([ticker_currency(t, deadline) for t in prices.columns], dtype=object)
+    unique, column_ccy = np.unique(codes, return_inverse=True)
+    # One aligned rate series per currency, then gathered out to every column
+    by_ccy = np.column_stack([fx_rates(np.full(len(prices), code, dtype=object), prices.index.values, base, deadline=deadline)
+                              for code in unique])
+    return prices * by_ccy[:, column_ccy]
+
+
+def apply_fx(positions, base: str = BASE_CURRENCY, fetch: bool = True):
+    """
+    Re-expresses every position's cost (at its purchase date) and value (today) in `base`.
+    Rates for all lots are looked up in one vectorised pass. Positions whose FX rate is unavailable
+    are flagged stale and keep their previous conversion when it was into `base`; otherwise only the
+    sub-unit scaling is applied and they are marked unconverted, which keeps them out of totals.
+    """
+    if not positions:
+        return
+    codes = [ticker_currency(p.ticker, fetch=fetch) for p in positions]
+    buy_rates = fx_rates(codes, [p.purchase_date for p in positions], base, fetch)
+    now_rates = fx_rates(codes, [pd.Timestamp.now().normalize()], base, fetch)
+    for pos, code, fx_buy, fx_now in zip(positions, codes, buy_rates, now_rates):
+        if np.isnan(fx_buy) or np.isnan(fx_now):
+            pos.stale = True
+            if pos.fx_base != base or pos.currency != code:
+                factor = fx_pair(code, base)[1]
+                pos.rebase(code, factor, factor)
+            continue
+        pos.rebase(code, float(fx_buy), float(fx_now), base)
+
+
+def currency_label(column: str, currency: str = BASE_CURRENCY) -> str:
+    """Column name with its "($)" unit replaced by the reporting currency."""
+    return column if currency == "USD" else column.replace("($)", f"({currency})")
+
+
+def currency_columns(df: pd.DataFrame, currency: str = BASE_CURRENCY) -> pd.DataFrame:
+    """Relabels a table's amount columns with the reporting currency for display."""
+    return df if currency == "USD" else df.rename(columns=lambda c: currency_label(c, currency))
+
+
+def format_money(value: float, currency: str = BASE_CURRENCY) -> str:
+    """An amount in the reporting currency, e.g. $1,234.50 or 1,234.50 EUR."""
+    return f"${value:,.2f}" if currency == "USD" else f"{value:,.2f} {currency}"
@@ -0,0 +1,224 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from src.fetcher import FetchError, fetch_history
+from src.stats import drawdown_state, window_stats
+from src.corporate_actions import CorporateActions
+
+EPOCH = np.datetime64("1970-01-01", "D")
+DEFAULT_BUDGET_MB = float(os.environ.get("PM_HISTORY_CACHE_MB", 256))
+
+
+class CompactHistory:
+    """
+    Memory-lean daily price history for one ticker.
+    Dates are stored as int32 day numbers and each kept column as a 1-D array;
+    splits and dividends are kept separately as sparse events.
+    """
+    def __init__(self, ticker: str, days: np.ndarray, columns: dict, drawdown: tuple = None,
+                 actions: CorporateActions = None):
+        self.ticker = ticker
+        self.days = days
+        self.columns = columns
+        self.actions = actions if actions is not None else CorporateActions.from_arrays(days, np.empty(0))
+        self.fetched_at = time.time()
+        # Running (peak, max drawdown) of the close, carried forward when bars are appended
+        close = columns.get("Close", np.empty(0))
+        self.drawdown = drawdown if drawdown is not None else drawdown_state(close)
+        self._stats = None
+
+    @classmethod
+    def from_frame(cls, ticker: str, hist: pd.DataFrame, columns=("Close",), dtype=np.float32):
+        """Builds a compact copy of a yfinance history frame, dropping unused columns."""
+        if hist.empty:
+            return cls(ticker, np.empty(0, dtype=np.int32), {})
+        index = hist.index.tz_localize(None) if hist.index.tz is not None else hist.index
+        days = (index.values.astype("datetime64[D]") - EPOCH).astype(np.int32)
+        data = {c: hist[c].to_numpy(dtype=dtype) for c in columns if c in hist.columns}
+        actions = CorporateActions.from_arrays(
+            days, hist["Close"].to_numpy() if "Close" in hist.columns else np.zeros(len(days)),
+            hist["Stock Splits"].to_numpy() if "Stock Splits" in hist.columns else None,
+            hist["Dividends"].to_numpy() if "Dividends" in hist.columns else None,
+        )
+        return cls(ticker, days, data, actions=actions)
+
+    def extend(self, newer: "CompactHistory") -> "CompactHistory":
+        """
+        New history with the bars of `newer` appended. Bars on days this one already has are
+        overwritten, so a provisional intraday bar is replaced by the settled close.
+        """
+        if not len(newer.days):
+            return self
+        cut = np.searchsorted(self.days, newer.days[0], side="left")
+        days = np.concatenate([self.days[:cut], newer.days])
+        columns = {c: np.concatenate([a[:cut], newer.columns[c].astype(a.dtype)])
+                   for c, a in self.columns.items() if c in newer.columns}
+        if not columns:
+            return newer
+        close = columns.get("Close", np.empty(0))
+        # Overwritten bars are already folded into the running state, so it is rebuilt in that case
+        drawdown = (drawdown_state(close[cut:], *self.drawdown) if cut == len(self.days)
+                    else drawdown_state(close))
+        return CompactHistory(self.ticker, days, columns, drawdown, self.actions)
+
+    def stats(self) -> dict:
+        """Drawdown, 52-week range and trailing returns, computed once per version of the history."""
+        if self._stats is None:
+            self._stats = window_stats(self.days, self.columns.get("Close", np.empty(0)), *self.drawdown)
+        return self._stats
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + sum(a.nbytes for a in self.columns.values()) + self.actions.nbytes
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex((EPOCH + self.days.astype("timedelta64[D]")).astype("datetime64[ns]"))
+
+    def to_series(self, column: str = "Close") -> pd.Series:
+        """Expands one column back into a float64 pandas Series for analytics."""
+        if column not in self.columns:
+            return pd.Series(dtype=float, name=self.ticker)
+        return pd.Series(self.columns[column].astype(np.float64), index=self.index, name=self.ticker)
+
+    def first_on_or_after(self, date, column: str = "Close"):
+        """First value at or after `date` (None when the date is past the end of history)."""
+        day = (np.datetime64(pd.Timestamp(date).normalize().to_datetime64(), "D") - EPOCH).astype(np.int32)
+        i = np.searchsorted(self.days, day, side="left")
+        if i >= len(self.days) or column not in self.columns:
+            return None
+        return float(self.columns[column][i])
+
+    def last(self, column: str = "Close"):
+        """Most recent value of a column (None for an empty history)."""
+        if not len(self.days) or column not in self.columns:
+            return None
+        return float(self.columns[column][-1])
+
+
+class HistoryStore:
+    """
+    Process-wide LRU cache holding one CompactHistory per ticker.
+    Entries are evicted least-recently-used first once the byte budget is exceeded.
+    """
+    def __init__(self, budget_mb: float = DEFAULT_BUDGET_MB, columns=("Close",), dtype=np.float32):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.columns = tuple(columns)
+        self.dtype = dtype
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = 0
+
+    def peek(self, ticker: str):
+        """Returns the cached history without downloading (None if not cached)."""
+        with self._lock:
+            return self._entries.get(ticker.upper())
+
+    def get(self, ticker: str, deadline: float = None) -> CompactHistory:
+        """Returns the cached history for a ticker, downloading it on first use (may raise FetchError)."""
+        ticker = ticker.upper()
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry is not None:
+                self._entries.move_to_end(ticker)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Download outside the lock so one slow ticker does not block the others
+        hist = fetch_history(ticker, deadline, period="max")
+        entry = CompactHistory.from_frame(ticker, hist, self.columns, self.dtype)
+        self.put(entry)
+        return entry
+
+    def update(self, ticker: str, max_age: float = 3600, deadline: float = None) -> CompactHistory:
+        """
+        Returns the ticker's history, first appending any bars published since it was fetched.
+        Only the tail from the last cached day onwards is downloaded, at most once per `max_age`
+        seconds; that day is included so a bar cached mid-session is replaced by its final close.
+        A new split or dividend in the tail re-bases every earlier adjusted close, so the full
+        history is reloaded then.
+        """
+        entry = self.get(ticker, deadline)
+        if time.time() - entry.fetched_at < max_age or not len(entry.days):
+            return entry
+        start = (EPOCH + np.timedelta64(int(entry.days[-1]), "D")).astype(str)
+        try:
+            tail = fetch_history(entry.ticker, deadline, start=start, interval="1d")
+            newer = CompactHistory.from_frame(entry.ticker, tail, self.columns, self.dtype)
+            # An event on the overlapping first bar is keyed to the bar before it, which only the
+            # cache knows; anything not already among the cached events needs a full reload
+            keys = newer.actions.days
+            if len(newer.days) and newer.days[0] == entry.days[-1]:
+                prev = entry.days[-2] if len(entry.days) > 1 else entry.days[-1] - 1
+                keys = np.where(keys == newer.days[0] - 1, prev, keys)
+            if np.setdiff1d(keys, entry.actions.days).size:
+                full = fetch_history(entry.ticker, deadline, period="max")
+                updated = CompactHistory.from_frame(entry.ticker, full, self.columns, self.dtype)
+            else:
+                updated = entry.extend(newer)
+        except FetchError:
+            # Serve what is cached; the tail is retried on the next call
+            return entry
+        updated.fetched_at = time.time()
+        self.put(updated)
+        return updated
+
+    def put(self, entry: CompactHistory):
+        """Inserts or replaces a ticker's history and enforces the memory budget."""
+        with self._lock:
+            old = self._entries.pop(entry.ticker, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[entry.ticker] = entry
+            self._bytes += entry.nbytes
+            self._evict_to_budget()
+
+    def _evict_to_budget(self):
+        # Always keep the newest entry even if it alone exceeds the budget
+        while self._bytes > self.budget_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def invalidate(self, ticker: str = None):
+        """Drops one ticker, or everything when no ticker is given."""
+        with self._lock:
+            if ticker is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif (old := self._entries.pop(ticker.upper(), None)) is not None:
+                self._bytes -= old.nbytes
+
+    def set_budget(self, budget_mb: float):
+        """Changes the memory budget, evicting immediately if the cache is now over it."""
+        with self._lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            self._evict_to_budget()
+
+    def stats_table(self, tickers) -> pd.DataFrame:
+        """Materialised per-ticker statistics for already-cached histories (never downloads)."""
+        rows = []
+        for ticker in dict.fromkeys(t.upper() for t in tickers):
+            entry = self.peek(ticker)
+            if entry is not None and entry.stats():
+                rows.append({"Stock Ticker": ticker, **entry.stats()})
+        return pd.DataFrame(rows)
+
+    def memory_usage(self) -> dict:
+        """Current cache size and hit/miss counters for monitoring."""
+        with self._lock:
+            return {
+                "tickers": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+HISTORY_STORE = HistoryStore()
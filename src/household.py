@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+from src.models import Portfolio
+from src.fetcher import REFRESH_BUDGET
+from src.fx import BASE_CURRENCY
+from src.analytics import holdings_matrix
+from src.data_loader import build_price_matrix
+
+TOTALS = ("Total Cost ($)", "Current Value ($)", "Profit ($)", "Dividends ($)")
+UNASSIGNED = "Unassigned"
+
+
+def _empty_history(index=None) -> pd.DataFrame:
+    return pd.DataFrame({"market_value": 0.0, "cost_basis": 0.0}, index=index if index is not None else pd.DatetimeIndex([]))
+
+
+def account_totals(portfolio: Portfolio) -> np.ndarray:
+    """Cost, value, profit and dividends of one account as a vector, so aggregates are plain sums."""
+    values = [(p.buy_value, p.current_value, p.profit, p.dividends) for p in portfolio.positions if p.valued]
+    return np.array(values, dtype=float).sum(axis=0) if values else np.zeros(len(TOTALS))
+
+
+def account_history(portfolio: Portfolio, prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Daily market value and cost basis of one account on the shared price grid.
+    Rows before the account's first purchase are zero, so every account lines up on the same
+    index and parents can add children's histories without reindexing.
+    """
+    if prices.empty or not portfolio.positions:
+        return _empty_history(prices.index)
+    columns = [t for t in dict.fromkeys(p.ticker for p in portfolio.positions) if t in prices.columns]
+    sub = prices[columns]
+    held, invested = holdings_matrix(portfolio.positions, sub)
+    return pd.DataFrame({"market_value": np.nansum(held * sub.to_numpy(), axis=1),
+                         "cost_basis": invested.sum(axis=1)}, index=prices.index)
+
+
+class PortfolioGroup:
+    """
+    A household or firm: a named node whose children are accounts (Portfolio objects) or other groups.
+    Totals and the daily value series are the sums of the children's. Each child's contribution is
+    kept, so replacing one account only pushes the difference up to the root.
+    """
+    def __init__(self, name: str, level: str = "household", base_currency: str = BASE_CURRENCY):
+        self.name = name
+        self.level = level
+        self.base_currency = base_currency
+        self.children = {}
+        self.parent = None
+        self.totals = np.zeros(len(TOTALS))
+        self.history = _empty_history()
+        # Root only: the price matrix shared by every account below it
+        self.prices = pd.DataFrame()
+        self._contributions = {}
+
+    def add(self, name: str, child):
+        """Attaches an account (Portfolio) or a sub-group; call rebuild() or refresh() afterwards."""
+        if isinstance(child, PortfolioGroup):
+            child.name, child.parent = name, self
+        self.children[name] = child
+        return child
+
+    def root(self) -> "PortfolioGroup":
+        node = self
+        while node.parent is not None:
+            node = node.parent
+        return node
+
+    def accounts(self, prefix: tuple = ()) -> dict:
+        """Every account below this node, keyed by its path of names."""
+        found = {}
+        for name, child in self.children.items():
+            if isinstance(child, PortfolioGroup):
+                found.update(child.accounts(prefix + (name,)))
+            else:
+                found[prefix + (name,)] = child
+        return found
+
+    def node(self, path: tuple):
+        """Follows a path of child names down from this node."""
+        node = self
+        for name in path:
+            node = node.children[name]
+        return node
+
+    def history_at(self, path: tuple) -> pd.DataFrame:
+        """Daily market value and cost basis of the group or account at `path` below this node."""
+        if not path:
+            return self.history
+        return self.node(path[:-1])._contributions[path[-1]][1]
+
+    def refresh(self, time_budget: float = REFRESH_BUDGET):
+        """
+        Reprices every account in one pass: positions from all accounts are pooled, so a ticker
+        held in many accounts is fetched once, then all aggregates are rebuilt bottom-up.
+        """
+        pooled = Portfolio(self.base_currency)
+        for account in self.accounts().values():
+            account.base_currency = self.base_currency
+            pooled.positions.extend(account.positions)
+        pooled.refresh_all(time_budget)
+        self.rebuild()
+
+    def rebuild(self):
+        """Recomputes every aggregate from already-priced accounts over one shared price matrix."""
+        root = self.root()
+        positions = [p for account in root.accounts().values() for p in account.positions]
+        root.prices = build_price_matrix([p.ticker for p in positions],
+                                         start=min((p.purchase_date for p in positions), default=None),
+                                         base_currency=root.base_currency) if positions else pd.DataFrame()
+        root._aggregate()
+
+    def _aggregate(self):
+        prices = self.root().prices
+        self._contributions = {}
+        for name, child in self.children.items():
+            if isinstance(child, PortfolioGroup):
+                child._aggregate()
+                self._contributions[name] = (child.totals, child.history)
+            else:
+                self._contributions[name] = (account_totals(child), account_history(child, prices))
+        self.totals = sum((c[0] for c in self._contributions.values()), np.zeros(len(TOTALS)))
+        self.history = _empty_history(prices.index)
+        for _, history in self._contributions.values():
+            self.history = self.history + history
+
+    def update_account(self, path: tuple, portfolio: Portfolio = None, time_budget: float = REFRESH_BUDGET):
+        """
+        Replaces (or just reprices) one account and updates every ancestor incrementally:
+        only that account is priced and summed, and its change in totals and value series is
+        added to each group on the way up. A ticker new to the firm, or a lot bought before the
+        shared price grid starts, widens the grid, which falls back to a full rebuild.
+        """
+        parent, name = self.node(path[:-1]), path[-1]
+        account = portfolio if portfolio is not None else parent.children[name]
+        account.base_currency = self.root().base_currency
+        account.refresh_all(time_budget)
+        parent.children[name] = account
+
+        root = self.root()
+        widens = root.prices.empty or any(p.ticker not in root.prices.columns or
+                                          pd.Timestamp(p.purchase_date) < root.prices.index[0]
+                                          for p in account.positions)
+        if widens or name not in parent._contributions:
+            self.rebuild()
+            return
+        old_totals, old_history = parent._contributions[name]
+        new = (account_totals(account), account_history(account, root.prices))
+        parent._contributions[name] = new
+        delta_totals, delta_history = new[0] - old_totals, new[1] - old_history
+
+        node = parent
+        while node is not None:
+            node.totals = node.totals + delta_totals
+            node.history = node.history + delta_history
+            if node.parent is not None:
+                node.parent._contributions[node.name] = (node.totals, node.history)
+            node = node.parent
+
+    def summary(self) -> pd.DataFrame:
+        """One row per firm, household and account with its totals and returns."""
+        rows = []
+
+        def visit(node, path, level, totals):
+            cost, value, profit, dividends = totals
+            rows.append({
+                "Level": level,
+                "Path": " / ".join(path) or self.name,
+                **{k: round(float(v), 2) for k, v in zip(TOTALS, totals)},
+                "Percentage Return (%)": round(profit / cost * 100, 2) if cost else 0.0,
+                "Total Return (%)": round((profit + dividends) / cost * 100, 2) if cost else 0.0,
+            })
+            if isinstance(node, PortfolioGroup):
+                for name, child in node.children.items():
+                    visit(child, path + (name,), "account" if not isinstance(child, PortfolioGroup) else child.level,
+                          node._contributions[name][0])
+
+        visit(self, (), self.level, self.totals)
+        return pd.DataFrame(rows)
+
+
+def build_firm(portfolio: Portfolio, name: str = "Firm") -> PortfolioGroup:
+    """
+    Splits an already-priced portfolio into accounts and households using each lot's labels.
+    The positions are shared, not copied, so no repricing happens; aggregates are built once.
+    """
+    firm = PortfolioGroup(name, level="firm", base_currency=portfolio.base_currency)
+    for pos in portfolio.positions:
+        household = firm.children.get(pos.household or UNASSIGNED)
+        if household is None:
+            household = firm.add(pos.household or UNASSIGNED,
+                                 PortfolioGroup(pos.household or UNASSIGNED, base_currency=portfolio.base_currency))
+        account = household.children.get(pos.account or UNASSIGNED)
+        if account is None:
+            account = household.add(pos.account or UNASSIGNED, Portfolio(portfolio.base_currency))
+        account.positions.append(pos)
+    firm.rebuild()
+    return firm
@@ -1,40 +1,147 @@
+import time
 import pandas as pd
 from datetime import datetime
-from src.data_loader import fetch_stock_value
+from src.fetcher import REFRESH_BUDGET, FetchError, Quote, fetch_quote, last_quote, run_with_budget
+from src.history_cache import HISTORY_STORE, CompactHistory
+from src.fx import BASE_CURRENCY, apply_fx, fx_pair, ticker_currency
+from src.corporate_actions import apply_corporate_actions
 
 class StockPosition:
     """
     Represents an individual stock holding.
     Encapsulates position-specific data and calculation logic.
     """
-    def __init__(self, ticker: str, purchase_date: datetime, quantity: int):
+    def __init__(self, ticker: str, purchase_date: datetime, quantity: int, account: str = None, household: str = None):
         self.ticker = ticker.upper()
         self.purchase_date = purchase_date
         self.quantity = quantity
+        # Where the lot sits in the account -> household -> firm hierarchy (None when ungrouped)
+        self.account = account
+        self.household = household
         self.current_value = 0.0
         self.buy_value = 0.0
         self.profit = 0.0
         self.return_pct = 0.0
         self.cost_per_share = 0.0
+        self.current_price = 0.0
+        self.price_as_of = None
+        self.stale = False
+        # Values are held in the portfolio's base currency: native amount x FX rate
+        self.currency = "USD"
+        self.fx_buy = 1.0
+        self.fx_now = 1.0
+        # Currency the FX rates convert into; None when no rate was available and values are in the quote currency
+        self.fx_base = "USD"
+        # Corporate actions since purchase: shares now per share bought, the dividend adjustment
+        # in Yahoo's adjusted close on the purchase day, and dividends received
+        self.split_factor = 1.0
+        self.price_factor = 1.0
+        self.dividends = 0.0
+        self.total_return_pct = 0.0
 
-    def update_metrics(self):
-        """Fetches latest prices and recalculates profit/return metrics."""
-        self.current_value, self.buy_value = fetch_stock_value(self.ticker, self.purchase_date, self.quantity)
+    @property
+    def shares(self) -> float:
+        """Shares held today, after any splits since purchase."""
+        return self.quantity * self.split_factor
+
+    def update_metrics(self, quote: Quote = None, history: CompactHistory = None):
+        """
+        Recalculates profit/return metrics from a quote and cached history, fetching both if no quote is given.
+        If pricing failed, the last known price is kept and the position is flagged stale.
+        """
+        if quote is None:
+            quote = fetch_quote(self.ticker)
+            try:
+                history = HISTORY_STORE.update(self.ticker)
+            except FetchError:
+                # Nothing cached and Yahoo unreachable: priced like a refresh_all that ran out of time
+                history = HISTORY_STORE.peek(self.ticker)
+            apply_corporate_actions([self], {self.ticker: history})
+        self.stale = quote.stale or history is None
+
+        if quote.price is None and not quote.stale:
+            # Yahoo answered with no data: unknown or delisted symbol
+            self.current_price = self.current_value = self.buy_value = 0.0
+        else:
+            price = quote.price if quote.price is not None else (history.last() if history else None)
+            if price is not None:
+                self.current_price = price * self.fx_now
+                self.current_value = self.current_price * self.shares
+                self.price_as_of = quote.as_of or self.price_as_of
+            if history is not None:
+                buy_price = history.first_on_or_after(self.purchase_date)
+                self.buy_value = (buy_price * self.shares / self.price_factor * self.fx_buy
+                                  if buy_price is not None else 0.0)
+        self.recalculate()
+
+    def apply_actions(self, split_factor: float, price_factor: float, dividends_per_share: float):
+        """Restates share count, cost and dividends for the splits and dividends since purchase."""
+        self.buy_value *= (split_factor / self.split_factor) * (self.price_factor / price_factor)
+        self.split_factor, self.price_factor = split_factor, price_factor
+        self.current_value = self.current_price * self.shares
+        self.dividends = dividends_per_share * self.shares * self.fx_now
+        self.recalculate()
+
+    @property
+    def converted(self) -> bool:
+        """Whether values are in the portfolio's base currency (unconverted lots are left out of totals)."""
+        return self.fx_base is not None
+
+    @property
+    def valued(self) -> bool:
+        """Whether cost and value are both known in the base currency; other lots are left out of totals."""
+        return self.converted and self.buy_value > 0
+
+    def rebase(self, currency: str, fx_buy: float, fx_now: float, base: str = None):
+        """Re-expresses cost (at the purchase-date rate) and price (at today's rate) with new FX rates into `base`.
+        With no base, the rates only scale sub-unit quotes and the values stay in the quote currency."""
+        self.fx_base = base
+        native_buy = self.buy_value / self.fx_buy
+        native_price = self.current_price / self.fx_now
+        native_dividends = self.dividends / self.fx_now
+        self.currency, self.fx_buy, self.fx_now = currency, fx_buy, fx_now
+        self.buy_value = native_buy * fx_buy
+        self.current_price = native_price * fx_now
+        self.current_value = self.current_price * self.shares
+        self.dividends = native_dividends * fx_now
+        self.recalculate()
+
+    def restore(self, buy_value: float, current_price: float, price_as_of: datetime = None,
+                currency: str = "USD", fx_buy: float = 1.0, fx_now: float = 1.0,
+                split_factor: float = 1.0, price_factor: float = 1.0, dividends: float = 0.0, fx_base: str = "USD"):
+        """Reapplies previously computed prices (e.g. from a saved snapshot) without any downloads."""
+        self.currency, self.fx_buy, self.fx_now, self.fx_base = currency, fx_buy, fx_now, fx_base
+        self.split_factor, self.price_factor, self.dividends = split_factor, price_factor, dividends
+        self.buy_value = buy_value
+        self.current_price = current_price
+        self.current_value = current_price * self.shares
+        self.price_as_of = price_as_of
+        self.stale = True
+        self.recalculate()
+
+    def recalculate(self):
+        """Derives profit, price and total return and cost per share from the current and buy values."""
         self.profit = self.current_value - self.buy_value
         self.return_pct = (self.profit / self.buy_value * 100) if self.buy_value != 0 else 0.0
+        self.total_return_pct = ((self.profit + self.dividends) / self.buy_value * 100) if self.buy_value != 0 else 0.0
         self.cost_per_share = self.buy_value / self.quantity if self.quantity > 0 else 0.0
 
     def to_dict(self):
         """Serializes position data for DataFrame/UI display."""
+        # Amounts without a known cost in the base currency are left blank
+        money = (lambda v: round(v, 2)) if self.valued else (lambda v: float("nan"))
         return {
             "Stock Ticker": self.ticker,
             "Purchase Date": self.purchase_date,
             "Quantity": self.quantity,
-            "Cost Per Share ($)": round(self.cost_per_share, 2),
-            "Total Cost ($)": round(self.buy_value, 2),
-            "Current Value ($)": round(self.current_value, 2),
-            "Profit ($)": round(self.profit, 2),
+            "Shares Held": round(self.shares, 4),
+            "Cost Per Share ($)": money(self.cost_per_share),
+            "Total Cost ($)": money(self.buy_value),
+            "Current Value ($)": money(self.current_value),
+            "Profit ($)": money(self.profit),
             "Percentage Return (%)": round(self.return_pct, 2),
+            "Dividends ($)": money(self.dividends),
+            "Total Return (%)": round(self.total_return_pct, 2),
             "Days Owned": (datetime.now() - self.purchase_date).days
         }
 
@@ -43,18 +150,56 @@ class Portfolio:
     Manages a collection of StockPosition objects.
     Demonstrates encapsulation and collection management.
     """
-    def __init__(self):
+    def __init__(self, base_currency: str = BASE_CURRENCY):
         self.positions = []
+        self.base_currency = base_currency
 
-    def add_position(self, ticker: str, purchase_date: datetime, quantity: int):
+    def add_position(self, ticker: str, purchase_date: datetime, quantity: int, account: str = None, household: str = None):
         """Adds a new StockPosition to the portfolio."""
-        pos = StockPosition(ticker, purchase_date, quantity)
+        pos = StockPosition(ticker, purchase_date, quantity, account, household)
         self.positions.append(pos)
 
-    def refresh_all(self):
-        """Updates metrics for all positions in the portfolio."""
+    def refresh_all(self, time_budget: float = REFRESH_BUDGET):
+        """
+        Updates metrics for all positions in the portfolio.
+        Each ticker is priced once, concurrently, and the whole refresh is bounded by `time_budget`
+        seconds; anything not priced in time is served from its last known price and flagged stale.
+        """
+        tickers = list(dict.fromkeys(pos.ticker for pos in self.positions))
+        deadline = time.monotonic() + time_budget
+        tasks = {("quote", t): (lambda t=t: fetch_quote(t, deadline)) for t in tickers}
+        tasks.update({("history", t): (lambda t=t: HISTORY_STORE.update(t, deadline=deadline)) for t in tickers})
+        tasks.update({("currency", t): (lambda t=t: ticker_currency(t, deadline)) for t in tickers})
+        results, _ = run_with_budget(tasks, time_budget)
+
         for pos in self.positions:
-            pos.update_metrics()
+            quote = results.get(("quote", pos.ticker)) or last_quote(pos.ticker)
+            history = results.get(("history", pos.ticker)) or HISTORY_STORE.peek(pos.ticker)
+            pos.update_metrics(quote, history)
+        apply_corporate_actions(self.positions, {t: results.get(("history", t)) or HISTORY_STORE.peek(t) for t in tickers})
+
+        # FX series for the currencies found, within what is left of the budget, then one vectorised conversion
+        pairs = {fx_pair(ticker_currency(t, fetch=False), self.base_currency)[0] for t in tickers} - {None}
+        run_with_budget({p: (lambda p=p: HISTORY_STORE.update(p, deadline=deadline)) for p in pairs},
+                        max(deadline - time.monotonic(), 0))
+        apply_fx(self.positions, self.base_currency, fetch=False)
+
+    def set_base_currency(self, base_currency: str):
+        """Converts all positions into another reporting currency without repricing them."""
+        self.base_currency = base_currency
+        apply_fx(self.positions, base_currency)
+
+    def get_stale_tickers(self) -> list:
+        """Tickers whose latest refresh fell back to a cached price."""
+        return sorted({pos.ticker for pos in self.positions if pos.stale})
+
+    def get_unconverted_tickers(self) -> list:
+        """Tickers with no FX rate into the base currency, which are left out of all totals."""
+        return sorted({pos.ticker for pos in self.positions if not pos.converted})
+
+    def get_uncosted_tickers(self) -> list:
+        """Priced tickers whose purchase price is not known yet, which are left out of all totals."""
+        return sorted({pos.ticker for pos in self.positions if pos.converted and not pos.valued and pos.current_value})
 
     def get_summary_df(self):
         """Returns a pandas DataFrame of all positions for display."""
@@ -64,7 +209,17 @@ class Portfolio:
 
     def get_totals(self):
         """Calculates aggregate portfolio metrics."""
-        total_profit = sum(pos.profit for pos in self.positions)
-        total_cost = sum(pos.buy_value for pos in self.positions)
+        valued = [pos for pos in self.positions if pos.valued]
+        total_profit = sum(pos.profit for pos in valued)
+        total_cost = sum(pos.buy_value for pos in valued)
         total_return = (total_profit / total_cost * 100) if total_cost != 0 else 0.0
         return total_profit, total_cost, total_return
+
+    def get_holdings(self) -> pd.Series:
+        """Current market value per ticker, with repeated lots combined."""
+        values = {}
+        for pos in self.positions:
+            if not pos.valued:
+                continue
+            values[pos.ticker] = values.get(pos.ticker, 0.0) + pos.current_value
+        return pd.Series(values, dtype=float)
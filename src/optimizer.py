@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from src.data_loader import build_price_matrix
+from src.risk import TRADING_DAYS, returns_matrix, covariance_matrix
+
+
+def project_simplex(w: np.ndarray) -> np.ndarray:
+    """Euclidean projection of every row of `w` onto {x >= 0, sum(x) = 1}."""
+    n = w.shape[1]
+    u = -np.sort(-w, axis=1)
+    css = np.cumsum(u, axis=1) - 1
+    k = np.arange(1, n + 1)
+    rho = np.count_nonzero(u - css / k > 0, axis=1)
+    theta = css[np.arange(len(w)), rho - 1] / rho
+    return np.maximum(w - theta[:, None], 0.0)
+
+
+def solve_frontier(mu: np.ndarray, cov: np.ndarray, n_points: int = 50, iters: int = 500) -> np.ndarray:
+    """
+    Long-only mean-variance weights for a grid of risk-aversion levels.
+    All frontier points are solved together by batched projected gradient descent,
+    so the cost per iteration is one (points x assets x assets) matrix product.
+    """
+    n = len(mu)
+    # Lambda 0 is the minimum-variance portfolio; the largest value tilts fully to return
+    lam = np.concatenate([[0.0], np.geomspace(1e-3, 10, n_points - 1)])
+    step = 1.0 / (2 * np.linalg.eigvalsh(cov)[-1] + 1e-12)
+    w = y = np.full((n_points, n), 1.0 / n)
+    t = 1.0
+    for _ in range(iters):
+        # Nesterov momentum (FISTA) converges far faster on ill-conditioned covariances
+        grad = 2 * y @ cov - lam[:, None] * mu
+        w_next = project_simplex(y - step * grad)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_next + (t - 1) / t_next * (w_next - w)
+        w, t = w_next, t_next
+    return w
+
+
+@st.cache_data(show_spinner=False)
+def efficient_frontier(prices: pd.DataFrame, risk_free: float = 0.0, n_points: int = 50,
+                       lookback: int = TRADING_DAYS) -> dict:
+    """Annualised efficient frontier plus min-variance and max-Sharpe weights."""
+    rets = returns_matrix(prices, lookback)
+    if rets.empty or rets.shape[1] < 2:
+        return {}
+    mu = rets.mean().to_numpy() * TRADING_DAYS
+    cov = covariance_matrix(rets).to_numpy() * TRADING_DAYS
+    weights = solve_frontier(mu, cov, n_points)
+
+    port_ret = weights @ mu
+    port_vol = np.sqrt(np.einsum("ij,jk,ik->i", weights, cov, weights))
+    sharpe = np.where(port_vol > 0, (port_ret - risk_free) / port_vol, -np.inf)
+    order = np.argsort(port_vol)
+    return {
+        "tickers": list(rets.columns),
+        "returns": port_ret[order],
+        "volatility": port_vol[order],
+        "weights": weights[order],
+        "min_variance": pd.Series(weights[np.argmin(port_vol)], index=rets.columns),
+        "max_sharpe": pd.Series(weights[np.argmax(sharpe)], index=rets.columns),
+        "asset_returns": pd.Series(mu, index=rets.columns),
+        "asset_volatility": pd.Series(np.sqrt(np.diag(cov)), index=rets.columns),
+    }
+
+
+def rebalance_trades(portfolio, target: pd.Series) -> pd.DataFrame:
+    """
+    Trades needed to move the Portfolio's holdings onto whole-share target quantities.
+    Split-adjusted holdings can be fractional, so current quantities and trades keep their fraction.
+    """
+    qty, value = {}, {}
+    for pos in portfolio.positions:
+        if not pos.valued:
+            continue
+        qty[pos.ticker] = qty.get(pos.ticker, 0) + pos.shares
+        value[pos.ticker] = value.get(pos.ticker, 0.0) + pos.current_value
+    qty = pd.Series(qty, dtype=float).reindex(target.index).fillna(0)
+    value = pd.Series(value, dtype=float).reindex(target.index).fillna(0)
+    price = (value / qty.replace(0, np.nan)).fillna(0)
+
+    target_qty = np.floor(np.divide(target * value.sum(), price, out=np.zeros(len(price)), where=price > 0))
+    trade = target_qty - qty
+    return pd.DataFrame({
+        "Stock Ticker": target.index,
+        "Current Weight (%)": np.round(value / value.sum() * 100, 2),
+        "Target Weight (%)": np.round(target * 100, 2),
+        "Current Quantity": np.round(qty, 4),
+        "Target Quantity": target_qty.astype(int),
+        "Trade (Shares)": np.round(trade, 4),
+        "Trade Value ($)": np.round(trade * price, 2),
+    }).reset_index(drop=True)
+
+
+def optimize_portfolio(portfolio, risk_free: float = 0.0, n_points: int = 50) -> dict:
+    """Headless entry point: frontier and rebalancing trades for a refreshed Portfolio."""
+    holdings = portfolio.get_holdings()
+    holdings = holdings[holdings > 0]
+    if len(holdings) < 2:
+        return {}
+    prices = build_price_matrix(holdings.index, base_currency=portfolio.base_currency)
+    frontier = efficient_frontier(prices, risk_free, n_points)
+    if frontier:
+        frontier["max_sharpe_trades"] = rebalance_trades(portfolio, frontier["max_sharpe"])
+        frontier["min_variance_trades"] = rebalance_trades(portfolio, frontier["min_variance"])
+    return frontier
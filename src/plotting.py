@@ -2,6 +2,7 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import yfinance as yf
 import pandas as pd
+from src.fx import currency_label, format_money
 
 
 def price_history_figure(ticker: str, buy_date) -> plt.Figure:
@@ -90,7 +91,7 @@ def portfolio_value_figure(table) -> plt.Figure:
 
     for _, row in table.iterrows():
         ticker = row["Stock Ticker"]
-        qty = row["Quantity"]
+        qty = row["Shares Held"]
         buy_date = row["Purchase Date"]
         total_cost = row["Total Cost ($)"]
         stock = yf.Ticker(ticker)
@@ -105,19 +106,30 @@ def portfolio_value_figure(table) -> plt.Figure:
         cost_series = pd.Series(total_cost, index=hist.index, name=ticker)
         all_costs.append(cost_series)
 
-    fig, ax = plt.subplots()
+    if not all_values:
+        return value_history_figure(pd.DataFrame(columns=["market_value", "cost_basis"]))
+    history = pd.DataFrame({
+        "market_value": pd.concat(all_values, axis=1).sum(axis=1),
+        "cost_basis": pd.concat(all_costs, axis=1).sum(axis=1),
+    })
+    return value_history_figure(history)
+
 
-    if all_values:
-        portfolio_total = pd.concat(all_values, axis=1).sum(axis=1)
-        cost_total = pd.concat(all_costs, axis=1).sum(axis=1)
+def value_history_figure(history, benchmark=None, currency: str = "USD") -> plt.Figure:
+    """Draws stored market value and cost basis curves (date-indexed DataFrame),
+    optionally with a benchmark bought with the same cash flows."""
+    fig, ax = plt.subplots()
 
-        ax.plot(portfolio_total.index, portfolio_total, linewidth=1.5, color="green", label="Market Value")
-        ax.plot(cost_total.index, cost_total, linewidth=1.5, color="grey", linestyle="--", label="Amount Invested")
-        ax.fill_between(portfolio_total.index, portfolio_total, alpha=0.15, color="green")
+    if not history.empty:
+        ax.plot(history.index, history["market_value"], linewidth=1.5, color="green", label="Market Value")
+        ax.plot(history.index, history["cost_basis"], linewidth=1.5, color="grey", linestyle="--", label="Amount Invested")
+        if benchmark is not None:
+            ax.plot(benchmark.index, benchmark, linewidth=1.2, color="royalblue", label=f"Same Cash in {benchmark.name}")
+        ax.fill_between(history.index, history["market_value"], alpha=0.15, color="green")
 
     ax.set_title("Portfolio Total Value Over Time")
     ax.set_xlabel("Date")
-    ax.set_ylabel("Total Value ($)")
+    ax.set_ylabel(currency_label("Total Value ($)", currency))
     ax.legend()
     fig.autofmt_xdate()
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
@@ -126,7 +138,7 @@ def portfolio_value_figure(table) -> plt.Figure:
     return fig
 
 
-def profit_loss_figure(table) -> plt.Figure:
+def profit_loss_figure(table, currency: str = "USD") -> plt.Figure:
     """Horizontal bar chart of unrealised P&L per stock, green/red by sign."""
     tickers = table["Stock Ticker"]
     profits = table["Profit ($)"]
@@ -138,7 +150,57 @@ def profit_loss_figure(table) -> plt.Figure:
     ax.xaxis.set_major_locator(plt.MultipleLocator(75))
     ax.tick_params(axis="x", labelsize=7)
     ax.set_title("Unrealised Profit / Loss by Stock")
-    ax.set_xlabel("Profit / Loss ($)")
+    ax.set_xlabel(currency_label("Profit / Loss ($)", currency))
+    fig.tight_layout()
+
+    return fig
+
+def risk_distribution_figure(pnl, var: float, currency: str = "USD") -> plt.Figure:
+    """Histogram of simulated portfolio P&L with the VaR threshold marked."""
+    fig, ax = plt.subplots()
+    ax.hist(pnl, bins=100, color="steelblue", alpha=0.8)
+    ax.axvline(x=-var, color="red", linestyle="--", linewidth=1, label=f"VaR ({format_money(var, currency)})")
+    ax.legend()
+    ax.set_title("Simulated Portfolio Profit / Loss")
+    ax.set_xlabel(currency_label("Profit / Loss ($)", currency))
+    ax.set_ylabel("Number of Paths")
+    fig.tight_layout()
+
+    return fig
+
+
+def efficient_frontier_figure(frontier: dict) -> plt.Figure:
+    """Efficient frontier curve with individual assets and the optimal portfolios marked."""
+    fig, ax = plt.subplots()
+    ax.plot(frontier["volatility"] * 100, frontier["returns"] * 100, linewidth=1.5, color="navy", label="Efficient Frontier")
+    ax.scatter(frontier["asset_volatility"] * 100, frontier["asset_returns"] * 100, s=12, color="grey", alpha=0.7, label="Holdings")
+
+    # Mark the two reference portfolios on the curve
+    for key, color, label in [("min_variance", "green", "Min Variance"), ("max_sharpe", "red", "Max Sharpe")]:
+        w = frontier[key].to_numpy()
+        idx = (abs(frontier["weights"] - w).sum(axis=1)).argmin()
+        ax.scatter(frontier["volatility"][idx] * 100, frontier["returns"][idx] * 100, s=60, color=color, marker="*", label=label, zorder=3)
+
+    ax.legend()
+    ax.set_title("Efficient Frontier (Annualised)")
+    ax.set_xlabel("Volatility (%)")
+    ax.set_ylabel("Expected Return (%)")
     fig.tight_layout()
 
-    return fig
\ No newline at end of file
+    return fig
+
+
+def scenario_profit_figure(summary, currency: str = "USD") -> plt.Figure:
+    """Portfolio profit for each purchase-date shift, one line per quantity multiplier."""
+    fig, ax = plt.subplots()
+    for mult, grp in summary.groupby("Quantity Multiplier"):
+        ax.plot(grp["Date Shift (days)"], grp["Profit ($)"], linewidth=1.5, marker=".", label=f"{mult:g}x quantity")
+    ax.axvline(x=0, color="red", linestyle="--", linewidth=1, label="Actual dates")
+    ax.axhline(y=0, color="black", linewidth=0.8)
+    ax.legend()
+    ax.set_title("What-If: Profit by Purchase Timing")
+    ax.set_xlabel("Purchase Date Shift (days, negative = earlier)")
+    ax.set_ylabel(currency_label("Profit / Loss ($)", currency))
+    fig.tight_layout()
+
+    return fig
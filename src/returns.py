@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from src.analytics import holdings_matrix
+from src.data_loader import build_price_matrix
+
+RATE_LOW, RATE_HIGH = -0.9999, 1000.0
+
+
+def xirr_batch(problem: np.ndarray, amounts: np.ndarray, years: np.ndarray, n_problems: int,
+               tol: float = 1e-9, max_iter: int = 100) -> np.ndarray:
+    """
+    Solves many XIRR problems at once from flat cash-flow arrays.
+    Flow i belongs to problem `problem[i]`, is worth `amounts[i]` (negative = money in) and
+    occurs `years[i]` after that problem's first flow. NPV and its derivative for every problem
+    come from two bincounts per iteration; Newton steps that leave the bracket fall back to bisection.
+    Problems without a sign change in NPV return NaN.
+    """
+    def npv(rate):
+        with np.errstate(over="ignore", invalid="ignore"):
+            disc = (1 + rate[problem]) ** -years
+            f = np.bincount(problem, amounts * disc, n_problems)
+            df = np.bincount(problem, -years * amounts * disc / (1 + rate[problem]), n_problems)
+        return f, df
+
+    lo = np.full(n_problems, RATE_LOW)
+    hi = np.full(n_problems, RATE_HIGH)
+    f_lo, _ = npv(lo)
+    f_hi, _ = npv(hi)
+    solvable = np.sign(f_lo) * np.sign(f_hi) < 0
+
+    rate = np.full(n_problems, 0.1)
+    for _ in range(max_iter):
+        f, df = npv(rate)
+        # Shrink the bracket around the root using the sign seen at the low end
+        below = np.sign(f) == np.sign(f_lo)
+        lo = np.where(below, rate, lo)
+        hi = np.where(below, hi, rate)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = rate - f / df
+        bad = ~np.isfinite(step) | (step <= lo) | (step >= hi)
+        new_rate = np.where(bad, (lo + hi) / 2, step)
+        if np.all(np.abs(new_rate - rate)[solvable] < tol):
+            rate = new_rate
+            break
+        rate = new_rate
+    return np.where(solvable, rate, np.nan)
+
+
+def chain_link(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """Time-weighted return of each column: daily returns net of flows, geometrically linked."""
+    prev = np.vstack([np.zeros((1, values.shape[1])), values[:-1]])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = np.where(prev > 0, (values - prev - flows) / prev, np.nan)
+    return np.nanprod(1 + daily, axis=0) - 1
+
+
+def annualise(total: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Converts cumulative returns over `days` calendar days into yearly rates."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(days > 0, (1 + total) ** (365.0 / days) - 1, np.nan)
+
+
+def portfolio_returns(portfolio, as_of: datetime = None) -> dict:
+    """
+    Money-weighted (XIRR) and time-weighted returns for every lot, every ticker and the portfolio.
+    All XIRR problems are solved in one batch; TWR comes from the aligned holdings value matrix.
+    """
+    positions = [p for p in portfolio.positions if p.valued]
+    if not positions:
+        return {}
+    as_of = pd.Timestamp(as_of or datetime.now()).normalize()
+    tickers = sorted({p.ticker for p in positions})
+    lot_dates = pd.to_datetime([p.purchase_date for p in positions]).normalize()
+    lot_years = ((as_of - lot_dates).days.to_numpy() / 365.0)
+    cost = np.array([p.buy_value for p in positions])
+    # Dividends received count towards each lot's terminal value (total return)
+    value = np.array([p.current_value + p.dividends for p in positions])
+    t_idx = np.searchsorted(tickers, [p.ticker for p in positions])
+    n_lots, n_tick = len(positions), len(tickers)
+
+    # Problems: one per lot, one per ticker, one for the portfolio
+    port_id = n_lots + n_tick
+    # Years since each ticker's earliest purchase
+    first_tick = np.zeros(n_tick)
+    np.maximum.at(first_tick, t_idx, lot_years)
+    problem = np.concatenate([np.arange(n_lots), np.arange(n_lots), n_lots + t_idx, n_lots + np.arange(n_tick),
+                              np.full(n_lots, port_id), [port_id]])
+    amounts = np.concatenate([-cost, value, -cost, np.bincount(t_idx, value, n_tick), -cost, [value.sum()]])
+    # Years measured from each problem's first flow; the closing flow sits at `as_of`
+    years = np.concatenate([np.zeros(n_lots), lot_years, first_tick[t_idx] - lot_years, first_tick,
+                            lot_years.max() - lot_years, [lot_years.max()]])
+    irr = xirr_batch(problem, amounts, years, port_id + 1)
+
+    # Time-weighted: value and flows per ticker on the shared date grid
+    prices = build_price_matrix(tickers, start=lot_dates.min(), base_currency=portfolio.base_currency)
+    twr_tick = np.full(n_tick, np.nan)
+    twr_port = np.nan
+    if not prices.empty:
+        held, invested = holdings_matrix(positions, prices)
+        values = np.nan_to_num(held * prices.to_numpy())
+        flows = np.diff(invested, axis=0, prepend=0)
+        order = prices.columns.get_indexer(tickers)
+        twr_tick = np.where(order >= 0, chain_link(values, flows)[np.clip(order, 0, None)], np.nan)
+        twr_port = chain_link(values.sum(axis=1, keepdims=True), flows.sum(axis=1, keepdims=True))[0]
+
+    # A single lot has no interim flows, so its TWR is its buy-and-hold return
+    lot_twr = value / cost - 1
+    lot_days = lot_years * 365
+    tick_days = first_tick * 365
+    lots = pd.DataFrame({
+        "Stock Ticker": [p.ticker for p in positions],
+        "Purchase Date": [p.purchase_date for p in positions],
+        "TWR (%)": np.round(lot_twr * 100, 2),
+        "TWR Annualised (%)": np.round(annualise(lot_twr, lot_days) * 100, 2),
+        "XIRR (%)": np.round(irr[:n_lots] * 100, 2),
+    })
+    by_ticker = pd.DataFrame({
+        "Stock Ticker": tickers,
+        "Lots": np.bincount(t_idx, minlength=n_tick),
+        "TWR (%)": np.round(twr_tick * 100, 2),
+        "TWR Annualised (%)": np.round(annualise(twr_tick, tick_days) * 100, 2),
+        "XIRR (%)": np.round(irr[n_lots:port_id] * 100, 2),
+    })
+    return {
+        "lots": lots,
+        "tickers": by_ticker,
+        "twr": float(twr_port * 100),
+        "twr_annualised": float(annualise(np.array(twr_port), np.array(lot_years.max() * 365)) * 100),
+        "xirr": float(irr[port_id] * 100),
+    }
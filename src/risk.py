@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from statistics import NormalDist
+from src.data_loader import build_price_matrix
+
+TRADING_DAYS = 252
+MC_CHUNK = 20_000  # paths simulated per batch to bound peak memory
+
+
+def returns_matrix(prices: pd.DataFrame, lookback: int = TRADING_DAYS) -> pd.DataFrame:
+    """Aligned daily simple returns for the last `lookback` sessions where every asset traded."""
+    rets = prices.pct_change(fill_method=None).dropna(how="any")
+    return rets.iloc[-lookback:] if lookback else rets
+
+
+def covariance_matrix(rets: pd.DataFrame) -> pd.DataFrame:
+    """Sample covariance of daily returns (single matrix product on demeaned data)."""
+    x = rets.to_numpy()
+    x = x - x.mean(axis=0)
+    cov = x.T @ x / max(len(x) - 1, 1)
+    return pd.DataFrame(cov, index=rets.columns, columns=rets.columns)
+
+
+def asset_betas(rets: pd.DataFrame, bench: pd.Series) -> pd.Series:
+    """Beta of every asset against the benchmark, computed for all columns at once."""
+    joined = rets.join(bench.rename("__bench__"), how="inner")
+    x = joined.drop(columns="__bench__").to_numpy()
+    b = joined["__bench__"].to_numpy()
+    x = x - x.mean(axis=0)
+    b = b - b.mean()
+    var_b = b @ b
+    betas = (x.T @ b) / var_b if var_b else np.full(x.shape[1], np.nan)
+    return pd.Series(betas, index=rets.columns, name="Beta")
+
+
+def parametric_var(values: np.ndarray, mu: np.ndarray, cov: np.ndarray,
+                   confidence: float = 0.95, horizon: int = 1) -> tuple:
+    """Variance-covariance VaR and CVaR in dollars (losses reported as positive numbers)."""
+    mean = values @ mu * horizon
+    std = np.sqrt(values @ cov @ values * horizon)
+    z = NormalDist().inv_cdf(1 - confidence)
+    var = -(mean + z * std)
+    cvar = -(mean - std * NormalDist().pdf(z) / (1 - confidence))
+    return float(var), float(cvar)
+
+
+def historical_var(pnl: np.ndarray, confidence: float = 0.95) -> tuple:
+    """Empirical VaR and CVaR from a vector of P&L outcomes."""
+    if len(pnl) == 0: return 0.0, 0.0
+    cutoff = np.quantile(pnl, 1 - confidence)
+    tail = pnl[pnl <= cutoff]
+    return float(-cutoff), float(-tail.mean())
+
+
+def monte_carlo_pnl(values: np.ndarray, mu: np.ndarray, cov: np.ndarray, n_paths: int = 100_000,
+                    horizon: int = 1, seed: int = None) -> np.ndarray:
+    """
+    Simulate portfolio P&L with correlated lognormal asset returns.
+    `mu` and `cov` are the mean and covariance of daily log returns, so the drift needs no Ito term.
+    Paths are drawn in fixed-size batches so 100k+ scenarios stay within memory.
+    """
+    n = len(values)
+    # Small jitter keeps Cholesky stable for near-singular (e.g. duplicated) assets
+    chol = np.linalg.cholesky(cov * horizon + np.eye(n) * 1e-12)
+    drift = mu * horizon
+    rng = np.random.default_rng(seed)
+    out = np.empty(n_paths)
+    for start in range(0, n_paths, MC_CHUNK):
+        size = min(MC_CHUNK, n_paths - start)
+        shocks = rng.standard_normal((size, n)) @ chol.T
+        out[start:start + size] = np.expm1(drift + shocks) @ values
+    return out
+
+
+@st.cache_data(show_spinner=False)
+def risk_report(holdings: pd.Series, prices: pd.DataFrame, benchmark: pd.Series,
+                confidence: float = 0.95, horizon: int = 1, n_paths: int = 100_000,
+                lookback: int = TRADING_DAYS) -> dict:
+    """
+    Portfolio-level risk measures from an aligned price matrix.
+    Cached on its inputs, so results are reused until prices or holdings change.
+    """
+    rets = returns_matrix(prices[holdings.index], lookback)
+    if rets.empty:
+        return {}
+    values = holdings.to_numpy(dtype=float)
+    log_rets = np.log1p(rets)
+    mu = log_rets.mean().to_numpy()
+    cov = covariance_matrix(rets)
+    cov_log = covariance_matrix(log_rets).to_numpy()
+
+    hist_pnl = rets.to_numpy() @ values
+    mc_pnl = monte_carlo_pnl(values, mu, cov_log, n_paths, horizon, seed=0)
+    p_var, p_cvar = parametric_var(values, rets.mean().to_numpy(), cov.to_numpy(), confidence, horizon)
+    h_var, h_cvar = historical_var(hist_pnl * np.sqrt(horizon), confidence)
+    mc_var, mc_cvar = historical_var(mc_pnl, confidence)
+
+    betas = asset_betas(rets, benchmark.pct_change(fill_method=None).dropna())
+    weights = values / values.sum()
+    ann_vol = np.sqrt(np.diag(cov.to_numpy()) * TRADING_DAYS) * 100
+
+    assets = pd.DataFrame({
+        "Stock Ticker": holdings.index,
+        "Weight (%)": np.round(weights * 100, 2),
+        "Annual Volatility (%)": np.round(ann_vol, 2),
+        "Beta": np.round(betas.to_numpy(), 2),
+    })
+    return {
+        "parametric": (p_var, p_cvar),
+        "historical": (h_var, h_cvar),
+        "monte_carlo": (mc_var, mc_cvar),
+        "portfolio_beta": float(np.nansum(weights * betas.to_numpy())),
+        "covariance": cov,
+        "assets": assets,
+        "mc_pnl": mc_pnl,
+    }
+
+
+def portfolio_risk(portfolio, benchmark: str = "SPY", confidence: float = 0.95,
+                   horizon: int = 1, n_paths: int = 100_000) -> dict:
+    """Headless entry point: risk report for a refreshed Portfolio without any UI."""
+    holdings = portfolio.get_holdings()
+    holdings = holdings[holdings > 0]
+    if holdings.empty:
+        return {}
+    prices = build_price_matrix(list(holdings.index) + [benchmark], base_currency=portfolio.base_currency)
+    holdings = holdings[holdings.index.isin(prices.columns)]
+    if holdings.empty or benchmark not in prices.columns:
+        return {}
+    return risk_report(holdings, prices, prices[benchmark],
+                       confidence, horizon, n_paths)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+from src.data_loader import build_price_matrix
+
+
+def evaluate_scenarios(prices: pd.DataFrame, tickers, buy_dates, quantities) -> pd.DataFrame:
+    """
+    Value any number of hypothetical lots against one aligned price matrix.
+    Each lot's buy price is the first close at or after its date, found with a single
+    searchsorted over the date index and a fancy-indexed gather, so no per-lot lookups.
+    """
+    tickers = np.asarray(tickers)
+    buy_dates = pd.to_datetime(np.asarray(buy_dates)).normalize()
+    quantities = np.asarray(quantities, dtype=float)
+
+    matrix = prices.to_numpy(dtype=float)
+    cols = prices.columns.get_indexer(tickers)
+    rows = np.searchsorted(prices.index.values, buy_dates.values, side="left")
+    valid = (cols >= 0) & (rows < len(prices))
+
+    buy_price = np.full(len(tickers), np.nan)
+    buy_price[valid] = matrix[rows[valid], cols[valid]]
+    current_price = np.full(len(tickers), np.nan)
+    current_price[cols >= 0] = matrix[-1, cols[cols >= 0]]
+
+    cost = buy_price * quantities
+    # Lots dated outside the available history have no buy price, so leave them unvalued
+    value = np.where(np.isnan(cost), np.nan, current_price * quantities)
+    profit = value - cost
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ret = np.where(cost > 0, profit / cost * 100, np.nan)
+
+    return pd.DataFrame({
+        "Stock Ticker": tickers,
+        "Purchase Date": buy_dates,
+        "Quantity": quantities,
+        "Total Cost ($)": cost,
+        "Current Value ($)": value,
+        "Profit ($)": profit,
+        "Percentage Return (%)": ret,
+    })
+
+
+def what_if(portfolio, date_offsets=range(-90, 91, 5), qty_multipliers=(0.5, 1.0, 2.0)) -> tuple:
+    """
+    Re-price every position under a grid of shifted purchase dates (in calendar days)
+    and scaled quantities. Returns (lot-level scenarios, portfolio-level summary).
+    """
+    if not portfolio.positions:
+        return pd.DataFrame(), pd.DataFrame()
+    tickers = np.array([p.ticker for p in portfolio.positions])
+    dates = pd.to_datetime([p.purchase_date for p in portfolio.positions]).normalize().values
+    qty = np.array([p.shares for p in portfolio.positions], dtype=float)
+
+    offsets = np.asarray(list(date_offsets), dtype="timedelta64[D]")
+    mults = np.asarray(qty_multipliers, dtype=float)
+    n_pos, n_off, n_mult = len(tickers), len(offsets), len(mults)
+
+    # Broadcast (offset, multiplier, position) into flat scenario arrays
+    grid_dates = (dates[None, None, :] + offsets[:, None, None]).repeat(n_mult, axis=1).ravel()
+    grid_qty = (qty[None, None, :] * mults[None, :, None]).repeat(n_off, axis=0).ravel()
+    grid_tickers = np.tile(tickers, n_off * n_mult)
+
+    start = grid_dates.min()
+    prices = build_price_matrix(tickers, start=start, base_currency=portfolio.base_currency)
+    if prices.empty:
+        return pd.DataFrame(), pd.DataFrame()
+    lots = evaluate_scenarios(prices, grid_tickers, grid_dates, grid_qty)
+    lots.insert(0, "Date Shift (days)", np.repeat(offsets.astype(int), n_mult * n_pos))
+    lots.insert(1, "Quantity Multiplier", np.tile(np.repeat(mults, n_pos), n_off))
+
+    summary = lots.groupby(["Date Shift (days)", "Quantity Multiplier"], as_index=False)[
+        ["Total Cost ($)", "Current Value ($)", "Profit ($)"]].sum(min_count=1)
+    summary["Percentage Return (%)"] = summary["Profit ($)"] / summary["Total Cost ($)"] * 100
+    return lots, summary.round(2)
@@ -0,0 +1,95 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from src.models import Portfolio
+
+SNAPSHOT_PATH = os.environ.get("PM_SNAPSHOT_PATH", "config/portfolio_snapshot.npz")
+_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="portfolio-refresh")
+
+
+def _epoch_seconds(ts) -> float:
+    return pd.Timestamp(ts).timestamp() if ts is not None else np.nan
+
+
+def save_snapshot(portfolio: Portfolio, path: str = SNAPSHOT_PATH):
+    """
+    Writes positions with their last prices and timestamps as compressed NumPy arrays.
+    The file is replaced atomically so a crash never leaves a half-written snapshot.
+    """
+    pos = portfolio.positions
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temp name: the page and the background refresh may save at the same time
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp.npz")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            np.savez_compressed(
+                out,
+                ticker=np.array([p.ticker for p in pos], dtype=str),
+                purchase_date=pd.to_datetime([p.purchase_date for p in pos]).values.astype("datetime64[D]"),
+                quantity=np.array([p.quantity for p in pos], dtype=np.int64),
+                buy_value=np.array([p.buy_value for p in pos], dtype=np.float64),
+                current_price=np.array([p.current_price for p in pos], dtype=np.float64),
+                price_as_of=np.array([_epoch_seconds(p.price_as_of) for p in pos], dtype=np.float64),
+                currency=np.array([p.currency for p in pos], dtype=str),
+                fx_base=np.array([p.fx_base or "" for p in pos], dtype=str),
+                account=np.array([p.account or "" for p in pos], dtype=str),
+                household=np.array([p.household or "" for p in pos], dtype=str),
+                fx=np.array([(p.fx_buy, p.fx_now) for p in pos], dtype=np.float64).reshape(-1, 2),
+                actions=np.array([(p.split_factor, p.price_factor, p.dividends) for p in pos], dtype=np.float64).reshape(-1, 3),
+                base_currency=np.array(portfolio.base_currency),
+                saved_at=np.float64(datetime.now().timestamp()),
+            )
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH):
+    """Rebuilds the saved Portfolio without downloads, returning (portfolio, saved_at) or (None, None).
+    Restored positions are flagged stale until they are refreshed."""
+    if not os.path.exists(path):
+        return None, None
+    with np.load(path, allow_pickle=False) as data:
+        # Snapshots written before multi-currency support are all USD
+        portfolio = Portfolio(str(data["base_currency"])) if "base_currency" in data else Portfolio("USD")
+        for i, ticker in enumerate(data["ticker"]):
+            labels = [str(data[c][i]) or None if c in data else None for c in ("account", "household")]
+            portfolio.add_position(str(ticker), pd.Timestamp(data["purchase_date"][i]), int(data["quantity"][i]), *labels)
+            as_of = data["price_as_of"][i]
+            fx = {"currency": str(data["currency"][i]), "fx_buy": float(data["fx"][i, 0]),
+                  "fx_now": float(data["fx"][i, 1])} if "currency" in data else {}
+            if "fx_base" in data:
+                fx["fx_base"] = str(data["fx_base"][i]) or None
+            actions = dict(zip(("split_factor", "price_factor", "dividends"), map(float, data["actions"][i]))) \
+                if "actions" in data else {}
+            portfolio.positions[-1].restore(float(data["buy_value"][i]), float(data["current_price"][i]),
+                                            datetime.fromtimestamp(as_of) if not np.isnan(as_of) else None,
+                                            **fx, **actions)
+        saved_at = datetime.fromtimestamp(float(data["saved_at"]))
+    return portfolio, saved_at
+
+
+def refresh_in_background(portfolio: Portfolio, path: str = SNAPSHOT_PATH):
+    """
+    Reprices a copy of the portfolio on a worker thread and saves a new snapshot; returns a Future.
+    The copy starts from the snapshot's values, so lots that cannot be priced keep them. A refresh
+    that leaves any ticker stale is not saved, so a good snapshot is never replaced by fallbacks.
+    """
+    fresh = Portfolio(portfolio.base_currency)
+    for pos in portfolio.positions:
+        fresh.add_position(pos.ticker, pos.purchase_date, pos.quantity, pos.account, pos.household)
+        fresh.positions[-1].restore(pos.buy_value, pos.current_price, pos.price_as_of, pos.currency, pos.fx_buy,
+                                    pos.fx_now, pos.split_factor, pos.price_factor, pos.dividends, pos.fx_base)
+
+    def work():
+        fresh.refresh_all()
+        if not fresh.get_stale_tickers():
+            save_snapshot(fresh, path)
+        return fresh
+
+    return _refresher.submit(work)
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+
+# Calendar-day lookbacks for trailing period returns
+PERIODS = {"1M Return (%)": 30, "3M Return (%)": 91, "1Y Return (%)": 365}
+
+
+def drawdown_state(close: np.ndarray, peak: float = -np.inf, max_drawdown: float = 0.0) -> tuple:
+    """
+    Folds new closes into a running (peak, max drawdown) pair in a single running-max pass.
+    Passing the previous state lets new bars be added without rescanning the history.
+    """
+    if not len(close):
+        return peak, max_drawdown
+    peaks = np.maximum.accumulate(np.maximum(close.astype(np.float64), peak))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        worst = np.nanmin(close / peaks - 1)
+    return float(peaks[-1]), float(min(max_drawdown, worst))
+
+
+def _close_on_or_before(days: np.ndarray, close: np.ndarray, day: int):
+    i = np.searchsorted(days, day, side="right") - 1
+    return float(close[i]) if i >= 0 else np.nan
+
+
+def window_stats(days: np.ndarray, close: np.ndarray, peak: float, max_drawdown: float) -> dict:
+    """
+    Drawdown, 52-week range and trailing returns from a day-number indexed close array.
+    Only the last year of bars is touched; older history enters through the running drawdown state.
+    """
+    if not len(days):
+        return {}
+    last_day, last = int(days[-1]), float(close[-1])
+    window = close[np.searchsorted(days, last_day - 365, side="left"):]
+    stats = {
+        "Max Drawdown (%)": max_drawdown * 100,
+        "Current Drawdown (%)": (last / peak - 1) * 100 if peak > 0 else np.nan,
+        "52W High": float(window.max()),
+        "52W Low": float(window.min()),
+    }
+    for name, lookback in PERIODS.items():
+        stats[name] = (last / _close_on_or_before(days, close, last_day - lookback) - 1) * 100
+    # YTD is measured from the last close of the previous calendar year
+    year_start = np.datetime64(np.datetime64(last_day, "D"), "Y").astype("datetime64[D]").astype(np.int64)
+    stats["YTD Return (%)"] = (last / _close_on_or_before(days, close, year_start - 1) - 1) * 100
+    return {k: round(v, 2) for k, v in stats.items()}
+
+
+def daily_returns_ex_flows(history: pd.DataFrame) -> np.ndarray:
+    """Daily portfolio returns with new purchases (cost-basis steps) removed from the gains."""
+    value = history["market_value"].to_numpy(dtype=float)
+    flows = np.diff(history["cost_basis"].to_numpy(dtype=float), prepend=np.nan)
+    prev = np.roll(value, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rets = (value - prev - flows) / prev
+    rets[0] = np.nan
+    return rets
+
+
+def portfolio_stats(history: pd.DataFrame) -> dict:
+    """Same statistics for a stored portfolio value history, on its flow-adjusted growth index."""
+    if len(history) < 2:
+        return {}
+    rets = np.nan_to_num(daily_returns_ex_flows(history))
+    index = np.cumprod(1 + rets)
+    days = history.index.values.astype("datetime64[D]").astype(np.int64)
+    stats = window_stats(days, index, *drawdown_state(index))
+    # The 52-week range of a growth index is not meaningful in dollars
+    del stats["52W High"], stats["52W Low"]
+    return stats
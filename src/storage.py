@@ -0,0 +1,181 @@
+import os
+import hashlib
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from peewee import (SqliteDatabase, Model, CharField, DateField, DateTimeField, FloatField,
+                    IntegerField, ForeignKeyField, fn)
+from src.data_loader import build_price_matrix, refresh_histories
+from src.analytics import holdings_matrix
+
+DB_PATH = os.environ.get("PM_DB_PATH", "config/portfolio.db")
+db = SqliteDatabase(None)
+
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+class PortfolioRecord(BaseModel):
+    """One stored portfolio, identified by a fingerprint of its lots."""
+    key = CharField(unique=True)
+    created_at = DateTimeField(default=datetime.now)
+    updated_at = DateTimeField(default=datetime.now)
+
+
+class LotRecord(BaseModel):
+    """A single purchase lot belonging to a stored portfolio."""
+    portfolio = ForeignKeyField(PortfolioRecord, backref="lots", on_delete="CASCADE")
+    ticker = CharField()
+    purchase_date = DateField(index=True)
+    quantity = IntegerField()
+    total_cost = FloatField()
+
+
+class ValuationSnapshot(BaseModel):
+    """Market value and cost basis of a portfolio at the close of one day."""
+    portfolio = ForeignKeyField(PortfolioRecord, backref="snapshots", on_delete="CASCADE")
+    date = DateField()
+    market_value = FloatField()
+    cost_basis = FloatField()
+
+    class Meta:
+        indexes = ((("portfolio", "date"), True),)
+
+
+def init_db(path: str = DB_PATH):
+    """Opens (and on first use creates) the SQLite database."""
+    if not db.is_closed() and db.database == path:
+        return
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db.init(path, pragmas={"journal_mode": "wal", "foreign_keys": 1})
+    db.create_tables([PortfolioRecord, LotRecord, ValuationSnapshot], safe=True)
+
+
+def portfolio_key(portfolio) -> str:
+    """Stable fingerprint of a portfolio's lots, so re-uploading the same CSV reuses its history."""
+    lots = sorted((p.ticker, pd.Timestamp(p.purchase_date).strftime("%Y-%m-%d"), p.quantity) for p in portfolio.positions)
+    # Stored values are in the reporting currency, so each currency keeps its own history
+    if portfolio.base_currency != "USD":
+        lots.append(portfolio.base_currency)
+    return hashlib.sha1(repr(lots).encode("utf-8")).hexdigest()
+
+
+def save_portfolio(portfolio) -> PortfolioRecord:
+    """Stores the portfolio and its lots, returning the existing record if already saved."""
+    init_db()
+    key = portfolio_key(portfolio)
+    with db.atomic():
+        record, created = PortfolioRecord.get_or_create(key=key)
+        if created:
+            LotRecord.insert_many([{
+                "portfolio": record,
+                "ticker": p.ticker,
+                "purchase_date": pd.Timestamp(p.purchase_date).date(),
+                "quantity": p.quantity,
+                # Lots without a known cost in the base currency are costed once it is available
+                "total_cost": p.buy_value if p.valued else 0.0,
+            } for p in portfolio.positions]).execute()
+        else:
+            costs = {(p.ticker, pd.Timestamp(p.purchase_date).date(), p.quantity): p.buy_value
+                     for p in portfolio.positions if p.valued}
+            for lot in LotRecord.select().where((LotRecord.portfolio == record) & (LotRecord.total_cost == 0)):
+                if costs.get((lot.ticker, lot.purchase_date, lot.quantity)):
+                    lot.total_cost = costs[(lot.ticker, lot.purchase_date, lot.quantity)]
+                    lot.save()
+    return record
+
+
+def backfill_values(portfolio, start=None) -> pd.DataFrame:
+    """
+    Daily market value and cost basis rebuilt from cached price histories.
+    Holdings per ticker are accumulated with one cumulative sum over purchase events.
+    """
+    tickers = [p.ticker for p in portfolio.positions]
+    first = min(pd.Timestamp(p.purchase_date) for p in portfolio.positions)
+    prices = build_price_matrix(tickers, start=max(first, pd.Timestamp(start)) if start is not None else first,
+                                base_currency=portfolio.base_currency)
+    if prices.empty:
+        return pd.DataFrame(columns=["date", "market_value", "cost_basis"])
+
+    held, invested = holdings_matrix(portfolio.positions, prices)
+    cost = invested.sum(axis=1)
+    value = np.nansum(held * prices.to_numpy(), axis=1)
+    return pd.DataFrame({"date": prices.index.date, "market_value": value, "cost_basis": cost})
+
+
+def record_snapshots(portfolio) -> PortfolioRecord:
+    """
+    Appends any missing daily snapshots for the portfolio.
+    The first call backfills the full history; afterwards the days from the last snapshot on
+    are rebuilt from settled closes, and today's row uses the freshly refreshed position values.
+    Cached histories are brought up to date first. If they still end before the previous
+    business day, today's row is held back so the next call retries the gap.
+    """
+    record = save_portfolio(portfolio)
+    if not portfolio.positions:
+        return record
+    today = datetime.now().date()
+    newest = (ValuationSnapshot.select(ValuationSnapshot.date).where(ValuationSnapshot.portfolio == record)
+              .order_by(ValuationSnapshot.date.desc()).first())
+    last = newest.date if newest else None
+
+    rows, complete = [], True
+    if last is None or last < today:
+        # Days since the last stored one (or the whole history): fill them from the shared price cache,
+        # starting at the last stored day so a row written from live values mid-session is settled
+        refresh_histories([p.ticker for p in portfolio.positions])
+        start = None if last is None else pd.Timestamp(last)
+        filled = backfill_values(portfolio, start)
+        rows = filled[filled["date"] < today].to_dict("records")
+        newest_bar = max([r["date"] for r in rows] + ([last] if last else []), default=None)
+        complete = newest_bar is not None and newest_bar >= (pd.Timestamp(today) - pd.offsets.BDay(1)).date()
+    # Today's row is rewritten with the latest refreshed values once the days before it are stored
+    if complete:
+        rows.append({
+            "date": today,
+            "market_value": sum(p.current_value for p in portfolio.positions if p.valued),
+            # Same dividend-adjusted cost basis as the backfilled rows
+            "cost_basis": sum(p.buy_value * p.price_factor for p in portfolio.positions if p.valued),
+        })
+
+    with db.atomic():
+        for chunk in range(0, len(rows), 500):
+            (ValuationSnapshot.insert_many([dict(r, portfolio=record) for r in rows[chunk:chunk + 500]])
+             .on_conflict_replace().execute())
+        PortfolioRecord.update(updated_at=datetime.now()).where(PortfolioRecord.id == record.id).execute()
+    return record
+
+
+def value_history(key: str) -> pd.DataFrame:
+    """Stored daily value and cost-basis curves for a portfolio (empty if never recorded)."""
+    init_db()
+    query = (ValuationSnapshot.select(ValuationSnapshot.date, ValuationSnapshot.market_value, ValuationSnapshot.cost_basis)
+             .join(PortfolioRecord).where(PortfolioRecord.key == key).order_by(ValuationSnapshot.date))
+    df = pd.DataFrame(list(query.dicts()), columns=["date", "market_value", "cost_basis"])
+    df["date"] = pd.to_datetime(df["date"])
+    return df.set_index("date")
+
+
+def latest_summary(key: str):
+    """
+    (profit, cost, return %, age in days) from the newest snapshot, or None if not stored.
+    Profit and return are measured against the amount actually paid for the stored lots, like
+    the position table, so profit plus cost is the snapshot's market value.
+    """
+    init_db()
+    snap = (ValuationSnapshot.select().join(PortfolioRecord).where(PortfolioRecord.key == key)
+            .order_by(ValuationSnapshot.date.desc()).first())
+    if snap is None:
+        return None
+    first_lot = (LotRecord.select(LotRecord.purchase_date).join(PortfolioRecord)
+                 .where(PortfolioRecord.key == key).order_by(LotRecord.purchase_date).first())
+    first_buy = first_lot.purchase_date if first_lot else None
+    paid = (LotRecord.select(fn.SUM(LotRecord.total_cost)).join(PortfolioRecord)
+            .where(PortfolioRecord.key == key).scalar()) or 0.0
+    profit = snap.market_value - paid
+    ret = (profit / paid * 100) if paid != 0 else 0.0
+    age = (datetime.now().date() - first_buy).days if first_buy else 0
+    return profit, paid, ret, age